@@ -0,0 +1,393 @@
+"""Cogのホットパスのオフラインベンチマーク (Discordへの接続なし)。
+
+使い方: python benchmarks/bench_cogs.py [--sizes 1000 10000 100000] [--iterations 300] [--output result.json]
+
+規模ごとに src/ を一時ディレクトリへコピーし、合成した SRD.csv / lyres.csv / glossary.db / races.json を置いて
+Cogを読み込み、起動処理 (CSVの取り込み・カタログの読み込み) を実行してから、偽の ApplicationContext /
+AutocompleteContext で各処理を呼び出す。モジュール単位の共有状態 (プール・カタログ・キャッシュ) が規模の間で
+混ざらないよう、規模ごとに別プロセスで実行する。data/ 配下は変更しない。
+
+結果 (p50/p99/平均の所要時間・スループット・tracemallocのピークメモリ) はJSONで出力するので、
+リビジョン間で比較できる。
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(REPO_DIR, 'src')
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+MEMORY_ITERATIONS = 50 # ピークメモリを測るときの実行回数 (tracemalloc は遅いので所要時間とは別に測る)
+USER_COUNT = 50 # 呪文セットを切り替える利用者の数
+
+SYLLABLES = (
+    'ア', 'イ', 'ウ', 'エ', 'オ', 'カ', 'キ', 'ク', 'ケ', 'コ', 'サ', 'シ', 'ス', 'セ', 'ソ', 'タ', 'チ', 'ツ', 'テ', 'ト',
+    'ナ', 'ニ', 'ヌ', 'ネ', 'ノ', 'ハ', 'ヒ', 'フ', 'ヘ', 'ホ', 'マ', 'ミ', 'ム', 'メ', 'モ', 'ラ', 'リ', 'ル', 'レ', 'ロ',
+    'ガ', 'ギ', 'グ', 'ゲ', 'ゴ', 'ザ', 'ジ', 'ズ', 'ダ', 'デ', 'ド', 'バ', 'ビ', 'ブ', 'ボ', 'ン', 'ー', 'ッ',
+)
+PHRASES = (
+    '酸のあぶくを投げつける。', '1d6[火]ダメージを与える。', '目標は[判断力]セーヴを行う。', '失敗すると次のターンまで移動できない。',
+    '術者の周囲10ft以内のクリーチャー全てに効果がある。', '集中が途切れると効果は終了する。', '攻撃ロールに有利を得る。',
+)
+
+
+# --------------------------------------------------------------------------------
+#  合成データ
+# --------------------------------------------------------------------------------
+def _make_name(rng: random.Random, used: set) -> str:
+    while True:
+        words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))) for _ in range(rng.randint(1, 3))]
+        name = '・'.join(words)
+        if name in used:
+            name = f'{name}{len(used)}'
+        if name not in used:
+            used.add(name)
+            return name
+
+
+def _make_text(rng: random.Random) -> str:
+    # 大半は短く、一部はフィールドの上限 (1024文字) を超える長さにする
+    count = rng.randint(40, 70) if rng.random() < 0.02 else rng.randint(1, 12)
+    return ''.join(rng.choice(PHRASES) for _ in range(count))
+
+
+def write_spell_csv(path: str, columns, class_codes, size: int, rng: random.Random):
+    used = set()
+    with open(path, 'w', encoding='utf-8-sig', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=columns)
+        writer.writeheader()
+        for spell_id in range(1, size + 1):
+            row = {column: '' for column in columns}
+            row.update({
+                'ID': spell_id,
+                'name': _make_name(rng, used),
+                'level': rng.randint(0, 9),
+                'type': rng.choice(('初級・召喚術', '1レベル・力術', '3レベル・死霊術', '5レベル・心術')),
+                'Stime': rng.choice(('1act', '1bns', '1rea', '1分')),
+                'Range': rng.choice(('自身', '接触', '60ft', '120ft')),
+                'Ref': f'PHB{rng.randint(200, 290)}',
+                'mov': '音声・動作',
+                'TimeC': rng.choice(('瞬間', '集中・1分', '1時間')),
+                'save': rng.choice(('なし', '[敏捷力]・半減', '[判断力]・無効')),
+                'target': rng.choice(('単体', '複数', '自身')),
+                'description': _make_text(rng),
+                'highlevel': _make_text(rng) if rng.random() < 0.3 else '',
+            })
+            for code in rng.sample(class_codes, rng.randint(1, 3)):
+                row[code] = 'Y'
+            writer.writerow(row)
+
+
+def write_glossary(path: str, size: int, rng: random.Random):
+    used = set()
+    with sqlite3.connect(path) as db:
+        # GlossaryCog と同じスキーマ (CREATE TABLE IF NOT EXISTS なので起動処理ではそのまま使われる)
+        db.execute('CREATE TABLE IF NOT EXISTS terms (name TEXT PRIMARY KEY, description TEXT)')
+        db.executemany(
+            'INSERT INTO terms (name, description) VALUES (?, ?)',
+            ((_make_name(rng, used), _make_text(rng)) for _ in range(size))
+        )
+    return sorted(used)
+
+
+def write_races(path: str, size: int, rng: random.Random):
+    used = set()
+    races = {}
+    for _ in range(size):
+        races[_make_name(rng, used)] = {
+            'emoji': '🧝',
+            'description': _make_text(rng),
+            'color': rng.randint(0, 0xFFFFFF),
+            'basic_info': {'サイズ': '中型', '移動速度': '30ft'},
+            'ability_score': '任意の能力値1つに+2',
+            'main_traits': {'暗視': '60ft', '鋭敏感覚': '〈知覚〉に習熟'},
+            'subraces': {'ハイ': _make_text(rng), 'ウッド': _make_text(rng)},
+            'legacy_traits': ['妖精の血', '鋭い五感', '夢見'],
+            'mixed_blood_traits': {'妖精の祖先': _make_text(rng)},
+        }
+    with open(path, 'w', encoding='utf-8') as races_file:
+        json.dump(races, races_file, ensure_ascii=False)
+    return list(races)
+
+
+# --------------------------------------------------------------------------------
+#  偽のコンテキスト
+# --------------------------------------------------------------------------------
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = f'user{user_id}'
+        self.display_name = self.name
+        self.bot = False
+        self.messages = []
+
+    async def send(self, *args, **kwargs):
+        self.messages.append((args, kwargs))
+
+
+class FakeApplicationContext:
+    """スラッシュコマンドの callback に渡す最小限の ApplicationContext。応答は responses に記録する。"""
+
+    def __init__(self, user_id: int, cog=None):
+        self.author = self.user = FakeUser(user_id)
+        self.cog = cog
+        self.guild = None
+        self.interaction = None
+        self.responses = []
+
+    async def respond(self, *args, **kwargs):
+        self.responses.append((args, kwargs))
+
+    async def defer(self, *args, **kwargs):
+        pass
+
+
+class FakeAutocompleteContext:
+    def __init__(self, value: str, cog=None):
+        self.value = value
+        self.cog = cog
+        self.options = {}
+        self.interaction = None
+
+
+# --------------------------------------------------------------------------------
+#  計測
+# --------------------------------------------------------------------------------
+def _percentile(sorted_values, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+async def measure(step, iterations: int, rng: random.Random) -> dict:
+    """step(rng) を iterations 回実行した所要時間と、別に実行したときの tracemalloc のピークを返す。"""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        step_started = time.perf_counter()
+        await step(rng)
+        latencies.append(time.perf_counter() - step_started)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in range(min(iterations, MEMORY_ITERATIONS)):
+            await step(rng)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'mean_ms': elapsed / iterations * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'ops_per_sec': iterations / elapsed if elapsed else 0.0,
+        'peak_kib': max(peak, 0) / 1024,
+    }
+
+
+def _fragment(rng: random.Random, name: str) -> str:
+    start = rng.randrange(len(name))
+    return name[start:start + rng.randint(1, 3)]
+
+
+def prepare_tree(tmp: str, size: int, rng: random.Random):
+    """tmp に src/ をコピーして合成データを置き、import できるようにする。(用語の一覧, 種族の一覧, 生成秒数) を返す。"""
+    src = os.path.join(tmp, 'src')
+    shutil.copytree(SRC_DIR, src, ignore=shutil.ignore_patterns('__pycache__', 'data'))
+    data_dir = os.path.join(src, 'data')
+    os.makedirs(data_dir)
+    sys.path.insert(0, src)
+    # whitelist Cog は読み込み時に ADMIN_ID を要求するので、未設定ならダミーの管理者IDを入れる
+    os.environ.setdefault('ADMIN_ID', '1')
+
+    from cogs.Lspellbook import LSpellbookCog
+    from cogs.spellbook import SpellbookCog
+
+    started = time.perf_counter()
+    write_spell_csv(os.path.join(data_dir, 'SRD.csv'), SpellbookCog.CSV_COLUMNS, SpellbookCog.CLASS_CODES, size, rng)
+    write_spell_csv(os.path.join(data_dir, 'lyres.csv'), LSpellbookCog.CSV_COLUMNS, LSpellbookCog.CLASS_CODES, size, rng)
+    terms = write_glossary(os.path.join(data_dir, 'glossary.db'), size, rng)
+    # 種族は実データでも数十件程度なので、呪文の1/100の件数にする
+    races = write_races(os.path.join(data_dir, 'races.json'), max(size // 100, 1), rng)
+    return terms, races, time.perf_counter() - started
+
+
+async def run_worker(size: int, iterations: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        terms, races, generate_seconds = prepare_tree(tmp, size, rng)
+        src = os.path.join(tmp, 'src')
+
+        import discord
+        from cogs.spellbook import SpellbookCog
+        from utils.catalog import spell_name_autocomplete
+        from utils.db import close_all
+        from utils.startup import startup
+        from cogs.race import race_autocomplete
+        from cogs.doc import term_autocomplete
+
+        bot = discord.Bot()
+        for file_name in sorted(os.listdir(os.path.join(src, 'cogs'))):
+            if file_name.endswith('.py') and not file_name.startswith('__'):
+                bot.load_extension(f'cogs.{file_name[:-3]}')
+        await startup.run(bot)
+
+        spellbook = bot.get_cog('SpellbookCog')
+        user_spell_sets = bot.get_cog('UserSpellSetsCog')
+        reaction_handler = bot.get_cog('SpellReactionHandlerCog')
+        glossary = bot.get_cog('GlossaryCog')
+        spells = spellbook.catalog.rows
+        names = [spell['name'] for spell in spells]
+        class_options = list(SpellbookCog.CLASS_CODES) + [None]
+        level_options = list(range(10)) + [None]
+        spell_name_complete = spell_name_autocomplete('spells')
+        # 一覧のEmbed作成は検索結果を作る時間を含めないよう、結果を先に用意しておく
+        filter_results = [spellbook.catalog.filter(rng.choice(class_options[:-1]), rng.choice(level_options[:-1])) for _ in range(20)]
+
+        async def filter_spells(rng):
+            await spellbook.filter_spells(rng.choice(class_options), rng.choice(level_options))
+
+        async def create_spell_list_embeds(rng):
+            spellbook.create_spell_list_embeds(rng.choice(filter_results))
+
+        async def get_spell_by_query(rng):
+            # ID・完全一致・部分一致・該当なしを混ぜる
+            kind = rng.random()
+            if kind < 0.25:
+                query = str(rng.randint(1, size))
+            elif kind < 0.5:
+                query = rng.choice(names)
+            elif kind < 0.9:
+                query = _fragment(rng, rng.choice(names))
+            else:
+                query = 'ソンザイシナイジュモン'
+            await user_spell_sets.get_spell_by_query(query)
+
+        async def spell_autocomplete(rng):
+            await spell_name_complete(FakeAutocompleteContext(rng.choice(names)[:rng.randint(1, 3)], spellbook))
+
+        async def term_complete(rng):
+            await term_autocomplete(FakeAutocompleteContext(_fragment(rng, rng.choice(terms)), glossary))
+
+        async def race_complete(rng):
+            await race_autocomplete(FakeAutocompleteContext(_fragment(rng, rng.choice(races))))
+
+        async def reaction_toggle(rng):
+            await reaction_handler._toggle_spell('spells', rng.randint(1, USER_COUNT), rng.randint(1, size))
+
+        async def command_spell(rng):
+            ctx = FakeApplicationContext(rng.randint(1, USER_COUNT), spellbook)
+            await spellbook.spell.callback(spellbook, ctx, rng.choice(class_options), rng.choice(level_options))
+
+        async def command_spellid(rng):
+            ctx = FakeApplicationContext(rng.randint(1, USER_COUNT), spellbook)
+            await spellbook.spellid.callback(spellbook, ctx, rng.randint(1, size))
+
+        scenarios = {
+            'filter_spells': filter_spells,
+            'create_spell_list_embeds': create_spell_list_embeds,
+            'get_spell_by_query': get_spell_by_query,
+            'spell_name_autocomplete': spell_autocomplete,
+            'term_autocomplete': term_complete,
+            'race_autocomplete': race_complete,
+            'reaction_toggle': reaction_toggle,
+            'command_spell': command_spell,
+            'command_spellid': command_spellid,
+        }
+        results = {}
+        for name, step in scenarios.items():
+            results[name] = await measure(step, iterations, rng)
+            print(f"[{size}] {name:<26} p50 {results[name]['p50_ms']:8.3f}ms  p99 {results[name]['p99_ms']:8.3f}ms  "
+                  f"{results[name]['ops_per_sec']:10.1f} ops/s  peak {results[name]['peak_kib']:9.1f}KiB", file=sys.stderr)
+
+        bot.get_cog('RaceCog').cog_unload()
+        await close_all()
+
+    return {
+        'rows': {'spells': size, 'Lspells': size, 'terms': len(terms), 'races': len(races)},
+        'generate_seconds': generate_seconds,
+        'startup': {
+            'ready_seconds': startup.ready_after,
+            'cogs': startup.timings,
+            'failures': startup.failures,
+        },
+        'scenarios': results,
+        'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='結果のJSONを書き出すファイル (省略時は標準出力)')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = asyncio.run(run_worker(args.worker, args.iterations, args.seed))
+        with open(args.result, 'w', encoding='utf-8') as result_file:
+            json.dump(result, result_file)
+        return
+
+    report = {
+        'revision': _revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'seed': args.seed,
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            result_path = os.path.join(tmp, f'{size}.json')
+            # Cogの print が結果のJSONに混ざらないよう、子プロセスの標準出力は標準エラーへ流す
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker', str(size), '--iterations', str(args.iterations),
+                 '--seed', str(args.seed), '--result', result_path],
+                stdout=sys.stderr, check=True
+            )
+            with open(result_path, encoding='utf-8') as result_file:
+                report['sizes'][str(size)] = json.load(result_file)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
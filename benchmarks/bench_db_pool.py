@@ -0,0 +1,80 @@
+"""呼び出しごとの aiosqlite.connect と共有プールの比較ベンチマーク。
+
+使い方: python benchmarks/bench_db_pool.py [--lookups 2000] [--concurrency 50]
+元の spells.db を一時ディレクトリへコピーしてから計測するため、data/ 配下は変更しない。
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import aiosqlite
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+from utils.db import ConnectionPool  # noqa: E402
+
+
+async def lookup_per_call(db_path, spell_id):
+    async with aiosqlite.connect(db_path) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute('SELECT * FROM spells WHERE ID = ?', (spell_id,))
+        return await cursor.fetchone()
+
+
+async def lookup_pooled(pool, spell_id):
+    return await pool.fetchone('SELECT * FROM spells WHERE ID = ?', (spell_id,))
+
+
+async def run(label, lookup, ids, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(spell_id):
+        async with semaphore:
+            start = time.perf_counter()
+            await lookup(spell_id)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(spell_id) for spell_id in ids))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{label:<10} total {elapsed:7.3f}s  {len(ids) / elapsed:9.1f} ops/s  p50 {p50:7.3f}ms  p99 {p99:7.3f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'spells.db')
+        shutil.copy(os.path.join(SRC_DIR, 'data', 'spells.db'), db_path)
+
+        async with aiosqlite.connect(db_path) as db:
+            cursor = await db.execute('SELECT ID FROM spells')
+            all_ids = [row[0] for row in await cursor.fetchall()]
+        ids = [all_ids[i % len(all_ids)] for i in range(args.lookups)]
+
+        pool = ConnectionPool(db_path)
+        await pool.open()
+        try:
+            for concurrency in (1, args.concurrency):
+                print(f"-- concurrency {concurrency}, {len(ids)} lookups")
+                await run('per-call', lambda spell_id: lookup_per_call(db_path, spell_id), ids, concurrency)
+                await run('pooled', lambda spell_id: lookup_pooled(pool, spell_id), ids, concurrency)
+        finally:
+            await pool.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
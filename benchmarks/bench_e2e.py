@@ -0,0 +1,198 @@
+"""インタラクション全体 (スラッシュコマンド → Cog → SQLite → 応答/リアクション削除/DM) の負荷試験。
+
+使い方: python benchmarks/bench_e2e.py [--size 10000] [--events 500] [--concurrency 10 100 1000]
+                                      [--latency 30] [--output result.json]
+
+fake_discord.py のサーバーをDiscordのREST APIの代わりに起動し、main.py の bot (チェック・計測フック・
+エラーハンドラー込み) をそこへログインさせる。イベントはゲートウェイの代わりに ConnectionState の
+パーサーへ直接注入し、bot からの応答 (インタラクションへの応答・リアクションの削除) が届くまでを1件として計る。
+同時実行数ごとのスループットと所要時間、ルートごとのREST呼び出し数・429の回数をJSONで出力する。
+本番のデータやDiscordには一切触れない。
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from bench_cogs import _percentile, _revision, prepare_tree
+from fake_discord import FakeDiscord
+
+CHANNEL_COUNT = 20
+USER_COUNT = 1000
+EVENT_TIMEOUT = 60.0 # 秒。これを過ぎても応答がなければ失敗として数える
+NUMBER_EMOJIS = ("1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣")
+
+
+async def run_load(server: FakeDiscord, make_event, count: int, concurrency: int) -> dict:
+    """make_event() で注入したイベントを同時に最大 concurrency 件ずつ count 件処理させ、結果を集計する。"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                done_at = await asyncio.wait_for(make_event(), EVENT_TIMEOUT)
+            except asyncio.TimeoutError:
+                failures += 1
+                return
+            latencies.append(done_at - started)
+
+    server.reset_stats()
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'events': count,
+        'concurrency': concurrency,
+        'completed': len(latencies),
+        'failed': failures,
+        'elapsed_seconds': elapsed,
+        'events_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p99_ms': _percentile(latencies, 0.99) * 1000 if latencies else None,
+        'max_ms': latencies[-1] * 1000 if latencies else None,
+        'rest': server.stats(),
+    }
+
+
+def _buttons(server: FakeDiscord, prefix: str):
+    """これまでに bot が送ったメッセージから、custom_id が prefix で始まる押せるボタンを集める。"""
+    return [
+        (message_id, component['custom_id'])
+        for message_id, message in list(server.messages.items())
+        for row in message['components']
+        for component in row.get('components', [])
+        if component.get('custom_id', '').startswith(prefix) and not component.get('disabled')
+    ]
+
+
+def _reaction_targets(server: FakeDiscord):
+    """呪文一覧のメッセージ (フッターに呪文IDがあるもの) と、そこに表示されている呪文の数。"""
+    targets = []
+    for message_id, message in list(server.messages.items()):
+        for embed in message['embeds']:
+            footer = (embed.get('footer') or {}).get('text', '')
+            if footer.startswith(('spell_ids:', 'Lspell_ids:')):
+                targets.append((message_id, len(footer.split(':', 1)[1].split(','))))
+                break
+    return targets
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    server = FakeDiscord(latency=args.latency / 1000, jitter=args.latency / 3000, seed=args.seed)
+    await server.start()
+    server.install()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        terms, races, _ = prepare_tree(tmp, args.size, rng)
+        # main.py の bot をそのまま使う (import しただけでは起動しない)
+        import main
+        from utils.metrics import metrics
+        from utils.startup import startup
+
+        bot = main.bot
+        bot.auto_sync_commands = False # コマンドは名前で解決させる (同期のREST呼び出しを計測に混ぜない)
+        await bot.login('fake-token')
+        await startup.run(bot)
+        server.attach(bot)
+
+        classes = ['WIZ', 'WAR', 'CRE', 'SOR', 'DOR', 'BRD', 'PRD', 'REN', None]
+        levels = list(range(10)) + [None]
+
+        def channel():
+            return rng.randint(1, CHANNEL_COUNT)
+
+        def user():
+            return rng.randint(1, USER_COUNT)
+
+        def slash_spell():
+            options = {'class_name': rng.choice(classes), 'level': rng.choice(levels)}
+            return server.send_slash_command('spell', options, user(), channel())
+
+        scenarios = {}
+        for concurrency in args.concurrency:
+            results = scenarios.setdefault(str(concurrency), {})
+            results['slash_spell'] = await run_load(server, slash_spell, args.events, concurrency)
+
+            page_buttons = _buttons(server, 'spellpage:')
+            results['page_button'] = await run_load(
+                server, lambda: server.click_button(*rng.choice(page_buttons), user()), args.events, concurrency
+            )
+
+            set_buttons = _buttons(server, 'spellset:')
+            results['spell_set_button'] = await run_load(
+                server, lambda: server.click_button(*rng.choice(set_buttons), user()), args.events, concurrency
+            )
+
+            targets = _reaction_targets(server)
+
+            def reaction():
+                message_id, shown = rng.choice(targets)
+                return server.add_reaction(message_id, NUMBER_EMOJIS[rng.randrange(shown)], user())
+            results['reaction'] = await run_load(server, reaction, args.events, concurrency)
+
+            for name, result in results.items():
+                print(f"[c={concurrency:>5}] {name:<17} {result['events_per_sec']:9.1f} events/s  "
+                      f"p50 {result['p50_ms'] or 0:9.2f}ms  p99 {result['p99_ms'] or 0:9.2f}ms  失敗 {result['failed']}  "
+                      f"429: {sum(route['rate_limited'] for route in result['rest'].values())}", file=sys.stderr)
+
+        # 溜まったDM通知を送り切ってから閉じる (SpellBot.close)
+        server.reset_stats()
+        await bot.close()
+        dm_rest = server.stats()
+        await server.stop()
+
+        return {
+            'revision': _revision(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'size': args.size,
+            'events': args.events,
+            'latency_ms': args.latency,
+            'seed': args.seed,
+            'startup_seconds': startup.ready_after,
+            'scenarios': scenarios,
+            'dm_flush_rest': dm_rest,
+            'bot_metrics': metrics.snapshot(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--events', type=int, default=500, help='1シナリオあたりのイベント数')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--latency', type=float, default=30.0, help='REST呼び出し1回の疑似的な遅延 (ミリ秒)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='結果のJSONを書き出すファイル (省略時は標準出力)')
+    args = parser.parse_args()
+
+    # Cogの print が結果のJSONに混ざらないよう、標準出力を標準エラーへ向けてから実行する
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        sys.stdout = stdout
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
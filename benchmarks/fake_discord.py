@@ -0,0 +1,411 @@
+"""負荷試験用のDiscord HTTP APIの代役 (ローカルのaiohttpサーバー)。
+
+pycord の Route.API_BASE_URL をこのサーバーに向けると、ボットが送るREST呼び出し
+(インタラクションへの応答・メッセージの取得・リアクションの削除・DMの送信など) を受け取り、
+ルートごとの件数と所要時間を記録する。各ルートには疑似的な遅延とレート制限 (バケット) を設けており、
+上限を超えると本物と同じ形式の 429 を返すので、pycord のレート制限処理も含めて計測できる。
+
+ゲートウェイからのイベントは接続せずに、ConnectionState のパーサー (parse_interaction_create など)
+へ直接渡して注入する (bench_e2e.py を参照)。
+"""
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+API_PREFIX = '/api/v10'
+BOT_USER_ID = 900000000000000001
+APPLICATION_ID = 900000000000000002
+
+# (メソッド, パスの正規表現, ルート名, 処理メソッド)
+ROUTES = [
+    ('GET', r'/users/@me', 'GET /users/@me', '_get_me'),
+    ('POST', r'/interactions/(?P<interaction_id>\d+)/(?P<token>[^/]+)/callback', 'POST /interactions/{id}/{token}/callback', '_interaction_callback'),
+    ('GET', r'/webhooks/\d+/(?P<token>[^/]+)/messages/@original', 'GET /webhooks/{app}/{token}/messages/@original', '_get_original'),
+    ('PATCH', r'/webhooks/\d+/(?P<token>[^/]+)/messages/@original', 'PATCH /webhooks/{app}/{token}/messages/@original', '_edit_original'),
+    ('POST', r'/webhooks/\d+/(?P<token>[^/]+)', 'POST /webhooks/{app}/{token}', '_followup'),
+    ('POST', r'/users/@me/channels', 'POST /users/@me/channels', '_create_dm'),
+    ('GET', r'/users/(?P<user_id>\d+)', 'GET /users/{user}', '_get_user'),
+    ('POST', r'/channels/(?P<channel_id>\d+)/messages', 'POST /channels/{channel}/messages', '_send_message'),
+    ('GET', r'/channels/(?P<channel_id>\d+)/messages/(?P<message_id>\d+)', 'GET /channels/{channel}/messages/{message}', '_get_message'),
+    ('DELETE', r'/channels/(?P<channel_id>\d+)/messages/(?P<message_id>\d+)/reactions/(?P<emoji>[^/]+)/(?P<user_id>\d+)',
+     'DELETE /channels/{channel}/messages/{message}/reactions/{emoji}/{user}', '_remove_reaction'),
+]
+_COMPILED_ROUTES = [(method, re.compile(pattern + '$'), name, handler) for method, pattern, name, handler in ROUTES]
+
+# ルート名 → (回数, 秒)。チャンネル単位のルートはチャンネルごとに別のバケットになる
+DEFAULT_BUCKETS = {
+    'DELETE /channels/{channel}/messages/{message}/reactions/{emoji}/{user}': (1, 0.25),
+    'POST /channels/{channel}/messages': (5, 5.0),
+    'GET /channels/{channel}/messages/{message}': (5, 1.0),
+    'POST /users/@me/channels': (10, 1.0),
+}
+GLOBAL_LIMIT = (50, 1.0) # インタラクションへの応答 (interactions / webhooks) は対象外
+_GLOBAL_EXEMPT = ('POST /interactions/', '/webhooks/')
+
+
+def _json_response(data, status: int = 200, headers: dict = None) -> web.Response:
+    # pycord は Content-Type が "application/json" と完全に一致する場合だけJSONとして読む (charset を付けない)
+    return web.Response(
+        body=json.dumps(data).encode('utf-8'), status=status,
+        headers={**(headers or {}), 'Content-Type': 'application/json'}
+    )
+
+
+class _Bucket:
+    __slots__ = ('limit', 'per', 'remaining', 'reset_at')
+
+    def __init__(self, limit: int, per: float):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def take(self, now: float):
+        """1回分を消費する。(許可されたか, 残り回数, リセットまでの秒数) を返す。"""
+        if now >= self.reset_at:
+            self.reset_at = now + self.per
+            self.remaining = self.limit
+        if self.remaining <= 0:
+            return False, 0, self.reset_at - now
+        self.remaining -= 1
+        return True, self.remaining, self.reset_at - now
+
+
+class RouteStats:
+    __slots__ = ('count', 'rate_limited', 'aborted', 'total')
+
+    def __init__(self):
+        self.count = 0
+        self.rate_limited = 0
+        self.aborted = 0 # 応答する前に bot が接続を切った回数
+        self.total = 0.0
+
+
+class FakeDiscord:
+    """Discord REST API の代役。start() してから install() で pycord の接続先を差し替える。"""
+
+    def __init__(self, latency: float = 0.03, jitter: float = 0.01, buckets: dict = None,
+                 global_limit=GLOBAL_LIMIT, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.bucket_limits = DEFAULT_BUCKETS if buckets is None else buckets
+        self.global_limit = global_limit
+        self.rng = random.Random(seed)
+        self.routes = defaultdict(RouteStats)
+        self.messages = {}
+        self.original_messages = {} # インタラクションのトークン → 最初の応答のメッセージID
+        self.dm_channels = {}
+        self._interaction_channels = {}
+        self._state = None
+        self._buckets = {}
+        self._global = _Bucket(*global_limit) if global_limit else None
+        self._waiters = {}
+        self._ids = itertools.count(int(time.time() * 1000 - 1420070400000) << 22)
+        self._runner = None
+        self.base_url = None
+        self.bot_user = self.user_payload(BOT_USER_ID, 'SpellBot', bot=True)
+
+    # ---- 起動・停止 ----
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_route('*', API_PREFIX + '/{path:.*}', self._dispatch)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://{host}:{port}{API_PREFIX}'
+        return self.base_url
+
+    def install(self):
+        """pycord のRESTの接続先をこのサーバーにする (プロセス全体に効く)。"""
+        from discord.http import Route
+        Route.API_BASE_URL = self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ---- 試験側から使うもの ----
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def expect(self, *key) -> asyncio.Future:
+        """key に対応する呼び出し (('interaction', ID) / ('reaction_removed', メッセージID, ユーザーID)) を待つFutureを返す。"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key] = future
+        return future
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                'count': stats.count,
+                'rate_limited': stats.rate_limited,
+                'aborted': stats.aborted,
+                'avg_ms': stats.total / stats.count * 1000 if stats.count else 0.0,
+            }
+            for name, stats in sorted(self.routes.items())
+        }
+
+    def reset_stats(self):
+        self.routes.clear()
+
+    @staticmethod
+    def user_payload(user_id: int, name: str, bot: bool = False) -> dict:
+        return {'id': str(user_id), 'username': name, 'discriminator': '0', 'global_name': None, 'avatar': None, 'bot': bot}
+
+    def message_payload(self, channel_id, data: dict, message_id: int = None) -> dict:
+        message_id = message_id or self.next_id()
+        return {
+            'id': str(message_id),
+            'channel_id': str(channel_id),
+            'type': 0,
+            'author': self.bot_user,
+            'content': data.get('content') or '',
+            'embeds': data.get('embeds') or [],
+            'components': data.get('components') or [],
+            'attachments': [],
+            'mentions': [],
+            'mention_roles': [],
+            'mention_everyone': False,
+            'pinned': False,
+            'tts': False,
+            'flags': data.get('flags') or 0,
+            'timestamp': '2024-01-01T00:00:00+00:00',
+            'edited_timestamp': None,
+        }
+
+    # ---- ゲートウェイの代役 (イベントの注入) ----
+    def attach(self, bot):
+        """イベントを注入する先のボットを設定する。"""
+        self._state = bot._connection
+
+    def _inject_interaction(self, interaction_type: int, data: dict, user_id: int, channel_id: int, message: dict = None):
+        interaction_id = self.next_id()
+        token = f'token{interaction_id}'
+        self._interaction_channels[token] = channel_id
+        payload = {
+            'id': str(interaction_id),
+            'application_id': str(APPLICATION_ID),
+            'type': interaction_type,
+            'data': data,
+            'token': token,
+            'version': 1,
+            'channel_id': str(channel_id),
+            'channel': {'id': str(channel_id), 'type': 1, 'recipients': [self.user_payload(user_id, f'user{user_id}')]},
+            'user': self.user_payload(user_id, f'user{user_id}'),
+            'locale': 'ja',
+            'app_permissions': '0',
+            'context': 1,
+        }
+        if message is not None:
+            payload['message'] = message
+            # ボタンの押下への応答 (UPDATE_MESSAGE) はボタンが付いているメッセージを書き換える
+            self.original_messages[token] = int(message['id'])
+        future = self.expect('interaction', interaction_id)
+        self._state.parse_interaction_create(payload)
+        return future
+
+    def send_slash_command(self, name: str, options: dict, user_id: int, channel_id: int) -> asyncio.Future:
+        """スラッシュコマンドを実行させ、最初の応答が届いた時点で完了するFutureを返す。"""
+        data = {
+            'id': str(self.next_id()),
+            'name': name,
+            'type': 1,
+            'options': [
+                {'name': key, 'type': 4 if isinstance(value, int) else 3, 'value': value}
+                for key, value in options.items() if value is not None
+            ],
+        }
+        return self._inject_interaction(2, data, user_id, channel_id)
+
+    def click_button(self, message_id: int, custom_id: str, user_id: int) -> asyncio.Future:
+        """メッセージのボタンを押させ、応答が届いた時点で完了するFutureを返す。"""
+        message = self.messages[message_id]
+        data = {'custom_id': custom_id, 'component_type': 2}
+        return self._inject_interaction(3, data, user_id, int(message['channel_id']), message)
+
+    def add_reaction(self, message_id: int, emoji: str, user_id: int) -> asyncio.Future:
+        """リアクションを付けさせ、ボットがそのリアクションを削除した時点で完了するFutureを返す。"""
+        message = self.messages[message_id]
+        future = self.expect('reaction_removed', message_id, user_id)
+        self._state.parse_message_reaction_add({
+            'user_id': str(user_id),
+            'channel_id': message['channel_id'],
+            'message_id': str(message_id),
+            'emoji': {'id': None, 'name': emoji},
+            'type': 0,
+            'burst': False,
+        })
+        return future
+
+    # ---- リクエストの処理 ----
+    def _resolve(self, method: str, path: str):
+        for route_method, pattern, name, handler in _COMPILED_ROUTES:
+            if route_method == method:
+                match = pattern.match(path)
+                if match:
+                    return name, getattr(self, handler), match.groupdict()
+        return f"{method} {re.sub(r'[0-9]+', '{id}', path)} (未対応)", None, {}
+
+    def _rate_limit(self, name: str, params: dict):
+        now = time.monotonic()
+        if self._global is not None and not any(part in name for part in _GLOBAL_EXEMPT):
+            allowed, _, retry_after = self._global.take(now)
+            if not allowed:
+                return None, _json_response(
+                    {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': True},
+                    status=429, headers={'Via': '1.1 fake', 'X-RateLimit-Global': 'true', 'Retry-After': f'{retry_after:.3f}'}
+                )
+        limit = self.bucket_limits.get(name)
+        if limit is None:
+            return {}, None
+        key = (name, params.get('channel_id'))
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(*limit)
+        allowed, remaining, reset_after = bucket.take(now)
+        headers = {
+            'X-RateLimit-Limit': str(bucket.limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset-After': f'{reset_after:.3f}',
+            'X-RateLimit-Reset': f'{time.time() + reset_after:.3f}',
+            'X-RateLimit-Bucket': f'{name}:{key[1]}',
+        }
+        if not allowed:
+            return None, _json_response(
+                {'message': 'You are being rate limited.', 'retry_after': reset_after, 'global': False},
+                status=429, headers={**headers, 'Via': '1.1 fake', 'Retry-After': f'{reset_after:.3f}'}
+            )
+        return headers, None
+
+    async def _dispatch(self, request: web.Request):
+        started = time.perf_counter()
+        name, handler, params = self._resolve(request.method, '/' + request.match_info['path'])
+        stats = self.routes[name]
+        stats.count += 1
+        try:
+            headers, limited = self._rate_limit(name, params)
+            if limited is not None:
+                stats.rate_limited += 1
+                return limited
+            if self.latency:
+                await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+            if handler is None:
+                return _json_response({'message': 'Unknown route', 'code': 0}, status=404)
+            try:
+                payload = await self._read_payload(request)
+            except ConnectionResetError:
+                # 本文を送り終える前に bot が接続を切った (要求の取り消し)。処理せずに数えるだけにする
+                stats.aborted += 1
+                return web.Response(status=499)
+            response = await handler(request, payload, **params)
+            response.headers.update(headers)
+            return response
+        finally:
+            stats.total += time.perf_counter() - started
+
+    @staticmethod
+    async def _read_payload(request: web.Request) -> dict:
+        if not request.body_exists:
+            return {}
+        # インタラクションへの応答は payload_json を含むフォーム (ファイルがなければURLエンコード) で届く
+        if request.content_type in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+            form = await request.post()
+            return json.loads(form.get('payload_json') or '{}')
+        try:
+            return await request.json()
+        except ValueError:
+            return {}
+
+    def _resolve_waiter(self, *key):
+        future = self._waiters.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    # ---- 各ルート ----
+    async def _get_me(self, request, payload):
+        return _json_response(self.bot_user)
+
+    async def _interaction_callback(self, request, payload, interaction_id, token):
+        callback_type = payload.get('type')
+        data = payload.get('data') or {}
+        message = None
+        if callback_type == 4: # CHANNEL_MESSAGE_WITH_SOURCE
+            message = self.message_payload(self._interaction_channels.get(token, 0), data)
+            self.messages[int(message['id'])] = message
+            self.original_messages[token] = int(message['id'])
+        elif callback_type == 7: # UPDATE_MESSAGE (ページ送りなど)
+            message_id = self.original_messages.get(token)
+            message = self.messages.get(message_id)
+            if message is not None:
+                message.update({key: data[key] for key in ('content', 'embeds', 'components') if key in data})
+        self._resolve_waiter('interaction', int(interaction_id))
+        body = {
+            'interaction': {
+                'id': interaction_id,
+                'type': 0,
+                'response_message_loading': callback_type == 5,
+                'response_message_ephemeral': bool(data.get('flags', 0) & 64),
+            },
+            'resource': {'type': callback_type},
+        }
+        if message is not None:
+            body['resource']['message'] = message
+        return _json_response(body)
+
+    async def _get_original(self, request, payload, token):
+        message = self.messages.get(self.original_messages.get(token))
+        if message is None:
+            return _json_response({'message': 'Unknown Message', 'code': 10008}, status=404)
+        return _json_response(message)
+
+    async def _edit_original(self, request, payload, token):
+        message_id = self.original_messages.get(token)
+        message = self.messages.get(message_id)
+        if message is None:
+            message = self.message_payload(self._interaction_channels.get(token, 0), payload)
+            self.messages[int(message['id'])] = message
+            self.original_messages[token] = int(message['id'])
+        else:
+            message.update({key: payload[key] for key in ('content', 'embeds', 'components') if key in payload})
+        return _json_response(message)
+
+    async def _followup(self, request, payload, token):
+        message = self.message_payload(self._interaction_channels.get(token, 0), payload)
+        self.messages[int(message['id'])] = message
+        return _json_response(message)
+
+    async def _get_user(self, request, payload, user_id):
+        return _json_response(self.user_payload(int(user_id), f'user{user_id}'))
+
+    async def _create_dm(self, request, payload):
+        recipient = int(payload['recipient_id'])
+        channel_id = self.dm_channels.get(recipient)
+        if channel_id is None:
+            channel_id = self.dm_channels[recipient] = self.next_id()
+        return _json_response({
+            'id': str(channel_id), 'type': 1, 'last_message_id': None,
+            'recipients': [self.user_payload(recipient, f'user{recipient}')],
+        })
+
+    async def _send_message(self, request, payload, channel_id):
+        message = self.message_payload(channel_id, payload)
+        return _json_response(message)
+
+    async def _get_message(self, request, payload, channel_id, message_id):
+        message = self.messages.get(int(message_id))
+        if message is None:
+            return _json_response({'message': 'Unknown Message', 'code': 10008}, status=404)
+        return _json_response({**message, 'channel_id': channel_id})
+
+    async def _remove_reaction(self, request, payload, channel_id, message_id, emoji, user_id):
+        self._resolve_waiter('reaction_removed', int(message_id), int(user_id))
+        return web.Response(status=204)
@@ -4,22 +4,45 @@ import discord
 from discord.ext import commands, pages
 import aiosqlite 
 import os
-import csv
 from discord.commands import Option
 from typing import Optional
 
+from utils.auth import admin_only, whitelist_only
+from utils.catalog import get_catalog, spell_name_autocomplete
+from utils.csv_import import sync_csv
+from utils.db import get_pool
+from utils.embed_layout import FIELD_VALUE_LIMIT, Field, pack_fields, send_embeds, split_field, split_text
+from utils.metrics import metrics
+from utils.render_cache import render_cache
+from utils.spell_classes import setup_spell_classes
+from utils.spell_pages import PAGE_SIZE, SpellPager
+from utils.spell_messages import add_spell_set_buttons, parse_footer
+from utils.spell_search import search_spells, setup_spell_fts
+from utils.startup import startup
+from utils.suggestions import SUGGEST_PREFIX, not_found_reply, parse_suggestion_custom_id
+
 class LSpellbookCog(commands.Cog):
+    CSV_COLUMNS = (
+        'ID', 'name', 'level', 'type', 'Stime', 'Range', 'Ref', 'mov', 'TimeC', 'save', 'target', 'description', 'highlevel',
+        'WIZ', 'WAR', 'CRE', 'SOR', 'DOR', 'BRD', 'PRD', 'REN', 'TFS', 'ISR', 'PKN'
+    )
+    CLASS_CODES = ('WIZ', 'WAR', 'CRE', 'SOR', 'DOR', 'BRD', 'PRD', 'REN', 'TFS', 'ISR', 'PKN')
+
     def __init__(self, bot):
         self.bot = bot
         self.db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'Lspells.db')
-        self.bot.loop.create_task(self._async_setup_db()) # 非同期でDBセットアップを呼び出す
+        self.db = get_pool(self.db_path)
+        self.catalog = get_catalog('Lspells')
+        self.pager = SpellPager('Lspells', self.catalog, self.db, self.create_spell_page_embed, cog_name=self.qualified_name)
 
-    async def _async_setup_db(self):
+    async def async_init(self):
+        # 起動時に main.py の起動処理から呼ばれる
         await self._setup_db()
         await self._import_csv_to_db()
+        await self.catalog.reload()
 
     async def _setup_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.db.write() as db:
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS Lspells (
                     ID INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -48,138 +71,72 @@ class LSpellbookCog(commands.Cog):
                     PKN TEXT
                 )
             ''')
-            await db.commit()
+            await setup_spell_classes(db, 'Lspells', self.CLASS_CODES)
+            await setup_spell_fts(db, 'Lspells')
 
     async def _import_csv_to_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT COUNT(*) FROM Lspells')
-            count = (await cursor.fetchone())[0]
-            if count == 0: # テーブルが空の場合のみインポート
-                csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'lyres.csv')
-                with open(csv_path, 'r', encoding='utf-8-sig') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        data = {
-                            'ID': row.get('ID'),
-                            'name': row.get('name'),
-                            'level': row.get('level'),
-                            'type': row.get('type'),
-                            'Stime': row.get('Stime'),
-                            'Range': row.get('Range'),
-                            'Ref': row.get('Ref'),
-                            'mov': row.get('mov'),
-                            'TimeC': row.get('TimeC'),
-                            'save': row.get('save'),
-                            'target': row.get('target'),
-                            'description': row.get('description'),
-                            'highlevel': row.get('highlevel'),
-                            'WIZ': row.get('WIZ'),
-                            'WAR': row.get('WAR'),
-                            'CRE': row.get('CRE'),
-                            'SOR': row.get('SOR'),
-                            'DOR': row.get('DOR'),
-                            'BRD': row.get('BRD'),
-                            'PRD': row.get('PRD'),
-                            'REN': row.get('REN'),
-                            'TFS': row.get('TFS'),
-                            'ISR': row.get('ISR'),
-                            'PKN': row.get('PKN')
-                        }
-                        if not data['ID']:
-                            data['ID'] = None
-                        else:
-                            data['ID'] = int(data['ID'])
-                        if data['level'] and data['level'].isdigit():
-                            data['level'] = int(data['level'])
-                        else:
-                            data['level'] = None
-
-                        await db.execute('''
-                            INSERT OR IGNORE INTO Lspells (
-                                ID, name, level, type, Stime, Range, Ref, mov, TimeC, save, target, description, highlevel,
-                                WIZ, WAR, CRE, SOR, DOR, BRD, PRD, REN, TFS, ISR, PKN
-                            ) VALUES (
-                                :ID, :name, :level, :type, :Stime, :Range, :Ref, :mov, :TimeC, :save, :target, :description, :highlevel,
-                                :WIZ, :WAR, :CRE, :SOR, :DOR, :BRD, :PRD, :REN, :TFS, :ISR, :PKN
-                            )
-                        ''', data)
-                await db.commit()
+        # CSVの変更された行だけを差分で取り込む (起動時と /lspellsync で実行)
+        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'lyres.csv')
+        result = await sync_csv(self.db, 'Lspells', csv_path, self.CSV_COLUMNS, self.CLASS_CODES)
+        if result is None:
+            print(f"CSVが見つからないためインポートをスキップしました: {csv_path}")
+        return result
 
     async def get_spell_by_id(self, spell_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute('SELECT * FROM Lspells WHERE ID = ?', (spell_id,))
-            spell = await cursor.fetchone()
-            return spell
-        
+        return await self.db.fetchone('SELECT * FROM Lspells WHERE ID = ?', (spell_id,))
+
     async def get_spell_by_name(self, spell_name: str):
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute('SELECT * FROM Lspells WHERE name = ?', (spell_name,))
-            spell = await cursor.fetchone()
-            return spell
+        return await self.db.fetchone('SELECT * FROM Lspells WHERE name = ?', (spell_name,))
 
     async def filter_spells(self, class_name: str = None, level: int = None):
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.cursor()
+        # 読み込み済みであればメモリ上のカタログから絞り込む
+        if self.catalog.loaded:
+            return self.catalog.filter(class_name, level)
 
-            query = "SELECT * FROM Lspells WHERE 1=1"
+        if class_name:
+            query = "SELECT s.* FROM Lspells s JOIN spell_classes c ON c.spell_id = s.ID WHERE c.class_code = ?"
+            params = [class_name.upper()]
+        else:
+            query = "SELECT s.* FROM Lspells s WHERE 1=1"
             params = []
 
-            if class_name:
-                class_col = class_name.upper()
-                # クラス列が存在するか確認
-                cursor_info = await db.execute(f"PRAGMA table_info(Lspells)")
-                cols = [col[1] for col in await cursor_info.fetchall()]
-                if class_col in cols:
-                    query += f" AND {class_col} = ?"
-                    params.append('Y')
-                else:
-                    return []
+        if level is not None:
+            query += " AND s.level = ?"
+            params.append(level)
 
-            if level is not None:
-                query += " AND level = ?"
-                params.append(level)
-
-            query += " ORDER BY level"
-
-            cursor = await db.execute(query, tuple(params))
-            spells = await cursor.fetchall()
-            return spells
+        query += " ORDER BY s.level, s.ID"
+        return await self.db.fetchall(query, tuple(params))
 
     def create_spell_list_embeds(self, spells):
-        chunked_spells = [spells[i:i + 6] for i in range(0, len(spells), 6)]
+        chunked_spells = [spells[i:i + PAGE_SIZE] for i in range(0, len(spells), PAGE_SIZE)]
         if not chunked_spells:
             return [discord.Embed(title="検索結果", description="条件に合う呪文は見つかりませんでした。", color=discord.Color.red())]
+        return [self.create_spell_page_embed(chunk, i, len(chunked_spells)) for i, chunk in enumerate(chunked_spells)]
+
+    def create_spell_page_embed(self, chunk, page_index: int, page_count: int):
+        embed = discord.Embed(title=f"呪文リスト ({page_index+1}/{page_count})", color=discord.Color.blue())
+        page_spell_ids = [str(spell['ID']) for spell in chunk]
+        for spell in chunk:
+            description = spell['description']
+            if description and len(description) > 100:
+                description = description[:100] + "..."
+            elif not description:
+                description = "(説明なし)"
+
+            embed.add_field(
+                name=f"***▶ ID: {spell['ID']}                  {spell['name']}***",
+                value=f"レベル: {spell['level']}　　　|　　　タイプ: {spell['type']}　　　|　　　詠唱時間: {spell['Stime']}\n"
+                      f"射程: {spell['Range']}　　　|　　　目標: {spell['target']}\n"
+                      f"持続: {spell['TimeC']}　　　|　　　セーヴ: {spell['save']}\n\n"
+                      f"説明: {description}\n\n"
+                      f"------------------>>",
+                inline=False
+            )
+        embed.set_footer(text=f"Lspell_ids:{','.join(page_spell_ids)}")
+        return embed
 
-        embeds = []
-        for i, chunk in enumerate(chunked_spells):
-            embed = discord.Embed(title=f"呪文リスト ({i+1}/{len(chunked_spells)})", color=discord.Color.blue())
-            page_spell_ids = [str(spell['ID']) for spell in chunk]
-            for spell in chunk:
-                description = spell['description']
-                if description and len(description) > 100:
-                    description = description[:100] + "..."
-                elif not description:
-                    description = "(説明なし)"
-
-                embed.add_field(
-                    name=f"***▶ ID: {spell['ID']}                  {spell['name']}***",
-                    value=f"レベル: {spell['level']}　　　|　　　タイプ: {spell['type']}　　　|　　　詠唱時間: {spell['Stime']}\n"
-                          f"射程: {spell['Range']}　　　|　　　目標: {spell['target']}\n"
-                          f"持続: {spell['TimeC']}　　　|　　　セーヴ: {spell['save']}\n\n"
-                          f"説明: {description}\n\n"
-                          f"------------------>>",
-                    inline=False
-                )
-            embed.set_footer(text=f"spell_ids:{','.join(page_spell_ids)}")
-            embeds.append(embed)
-        return embeds
-
-    def create_spell_detail_embed(self, spell):
-        embed = discord.Embed(title=f"呪文詳細: {spell['name']}", color=discord.Color.green())
-
+    def create_spell_detail_embeds(self, spell):
+        # 高レベル化や説明が長い呪文はフィールドの上限を超えるため、複数のEmbedに分けて返す
         display_info = [
             ('ID', 'ID', True),
             ('name', '名前', True),
@@ -195,59 +152,107 @@ class LSpellbookCog(commands.Cog):
             ('highlevel', '高レベル化', True)
         ]
 
+        fields = []
         for key, display_name, inline_status in display_info:
-            value = spell[key] or "(なし)"
-            embed.add_field(name=display_name, value=f"**{value}**", inline=inline_status)
+            value = str(spell[key] or "(なし)")
+            fields.extend(
+                Field(field.name, f"**{field.value}**", field.inline)
+                for field in split_field(display_name, value, inline_status, FIELD_VALUE_LIMIT - 4)
+            )
 
         description = spell['description']
-        if description and len(description) > 1024:
-            for i, chunk in enumerate([description[j:j+1024] for j in range(0, len(description), 1024)]):
-                embed.add_field(name=f"説明 {i+1}/{len(description)//1024 + 1}", value=chunk, inline=False)
-        elif description:
-            embed.add_field(name="説明", value=description, inline=False)
+        if description:
+            chunks = split_text(description)
+            if len(chunks) > 1:
+                fields.extend(Field(f"説明 {i+1}/{len(chunks)}", chunk, False) for i, chunk in enumerate(chunks))
+            else:
+                fields.append(Field("説明", description, False))
         else:
-            embed.add_field(name="説明", value="(説明なし)", inline=False)
-        return embed
+            fields.append(Field("説明", "(説明なし)", False))
+        return pack_fields(fields, f"呪文詳細: {spell['name']}", color=discord.Color.green())
+
+    async def _get_detail_embeds(self, key, lookup):
+        """呪文詳細のEmbedのリストを描画キャッシュから返す。呪文が見つからない場合は None。"""
+        cache_key = render_cache.key(self.catalog, key)
+        embeds = render_cache.get(cache_key)
+        if embeds is None:
+            spell = await lookup()
+            if not spell:
+                return None
+            embeds = self.create_spell_detail_embeds(spell)
+            render_cache.put(cache_key, embeds)
+        return embeds
 
-    @commands.slash_command(name="lspell", description="呪文を検索し、一覧表示します。")
-    async def spell(self, ctx: discord.ApplicationContext, class_name: Option(str, description="WIZ,WAR,CRE,SOR,DOR,BRD,PRD,REN,TFS, ISR, PKN", default=None), level: Option(int, description="0-9", default=None)):
-        filtered_spells = await self.filter_spells(class_name, level)
-        embeds = self.create_spell_list_embeds(filtered_spells)
-        
+    async def _respond_spell_list(self, ctx: discord.ApplicationContext, embeds):
         if not embeds:
             await ctx.respond("条件に合う呪文は見つかりませんでした。", ephemeral=True)
             return
 
-        paginator = pages.Paginator(pages=embeds)
-        message = await paginator.respond(ctx.interaction, ephemeral=False)
+        # 各ページに表示中の呪文の番号ボタンを付ける (ページ送りのたびに差し替わる)
+        paginator = pages.Paginator(pages=[
+            pages.Page(embeds=[embed], custom_view=self._spell_set_view(embed)) for embed in embeds
+        ])
+        await paginator.respond(ctx.interaction, ephemeral=False)
+
+    def _spell_set_view(self, embed):
+        entry = parse_footer(embed.footer.text)
+        if entry is None:
+            return None
+        return add_spell_set_buttons(discord.ui.View(timeout=None), entry.table, entry.spell_ids)
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        # /spell のページ送りボタン (状態はcustom_idに持たせているので再起動後も応答できる)
+        if await self.pager.handle(interaction):
+            return
+        # /lspellname の「もしかして」ボタン
+        if interaction.type != discord.InteractionType.component:
+            return
+        spell_name = parse_suggestion_custom_id(interaction.custom_id, 'Lspells')
+        if spell_name is None or not await startup.admit(interaction, self):
+            return
+        with metrics.measure('component', SUGGEST_PREFIX):
+            embeds = await self._get_detail_embeds(('name', spell_name), lambda: self.get_spell_by_name(spell_name))
+            if embeds:
+                await send_embeds(interaction.respond, embeds)
+            else:
+                await interaction.response.send_message(f"呪文「{spell_name}」は見つかりませんでした。", ephemeral=True)
 
-        # 最初のページに表示された呪文に対してのみリアクションを追加
-        if len(embeds) > 0 and embeds[0].footer.text:
-            emojis = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣"]
-            num_spells = len(embeds[0].footer.text.split(":")[1].split(","))
-            for i in range(num_spells):
-                if i < len(emojis):
-                    await message.add_reaction(emojis[i])
+    @commands.slash_command(name="lspell", description="呪文を検索し、一覧表示します。")
+    async def spell(self, ctx: discord.ApplicationContext, class_name: Option(str, description="WIZ,WAR,CRE,SOR,DOR,BRD,PRD,REN,TFS, ISR, PKN", default=None), level: Option(int, description="0-9", default=None)):
+        page = await self.pager.first_page(class_name, level)
+        if page is None:
+            await ctx.respond("条件に合う呪文は見つかりませんでした。", ephemeral=True)
+            return
+
+        await ctx.respond(embed=page.embed, view=self.pager.view(page))
 
     @commands.slash_command(name="lspellid", description="指定したIDの呪文の詳細を表示します。")
     async def spellid(self, ctx: discord.ApplicationContext, spell_id: int):
-        spell = await self.get_spell_by_id(spell_id)
-        if spell:
-            embed = self.create_spell_detail_embed(spell)
-            await ctx.respond(embed=embed)
+        embeds = await self._get_detail_embeds(('id', spell_id), lambda: self.get_spell_by_id(spell_id))
+        if embeds:
+            await send_embeds(ctx.respond, embeds)
         else:
             await ctx.respond("指定されたIDの呪文は見つかりませんでした。", ephemeral=True)
 
     @commands.slash_command(name="lspellname", description="指定した名前の呪文の詳細を表示します。")
-    async def spellname(self, ctx: discord.ApplicationContext, spell_name: str):
-        spell = await self.get_spell_by_name(spell_name)
-        if spell:
-            embed = self.create_spell_detail_embed(spell)
-            await ctx.respond(embed=embed)
+    async def spellname(self, ctx: discord.ApplicationContext, spell_name: Option(str, description="呪文名", autocomplete=spell_name_autocomplete('Lspells'))):
+        embeds = await self._get_detail_embeds(('name', spell_name), lambda: self.get_spell_by_name(spell_name))
+        if embeds:
+            await send_embeds(ctx.respond, embeds)
         else:
-            await ctx.respond("指定されたIDの呪文は見つかりませんでした。", ephemeral=True)
+            content, view = not_found_reply(
+                f"呪文「{spell_name}」は見つかりませんでした。", 'Lspells', self.catalog.suggestions.suggest(spell_name)
+            )
+            await ctx.respond(content, view=view, ephemeral=True)
+
+    @commands.slash_command(name="lspellsearch", description="呪文の名前・説明・高レベル化を全文検索します。")
+    async def spellsearch(self, ctx: discord.ApplicationContext, query: Option(str, description="検索語 (空白区切りで複数指定)")):
+        spells = await search_spells(self.db, 'Lspells', query)
+        await self._respond_spell_list(ctx, self.create_spell_list_embeds(spells))
 
     @commands.slash_command(name="lspelladd", description="新しい呪文を登録します (ホワイトリストユーザーのみ)。")
+    @whitelist_only()
     async def spelladd(
         self,
         ctx: discord.ApplicationContext,
@@ -264,81 +269,86 @@ class LSpellbookCog(commands.Cog):
         mov: Optional[str] = None,
         highlevel: Optional[str] = None
     ):
-        glossary_cog = self.bot.get_cog("GlossaryCog")
-        if not glossary_cog or (not await glossary_cog._is_whitelisted(ctx.author.id) and not await glossary_cog._is_admin(ctx.author.id)):
-            await ctx.respond("このコマンドを実行する権限がありません。", ephemeral=True)
-            return
-
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                await db.execute('''
-                    INSERT INTO Lspells (
-                        name, level, type, Stime, Range, Ref, mov, TimeC, save, target, description, highlevel
-                    ) VALUES (
-                        ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-                    )
-                ''',
-                (
-                    name, level, type, stime, range, ref, mov, timec, save, target, description, highlevel
-                ))
-                await db.commit()
-                await ctx.respond(f"呪文 `{name}` を登録しました。")
-            except aiosqlite.IntegrityError:
-                await ctx.respond(f"呪文 `{name}` は既に登録されています。", ephemeral=True)
+        try:
+            await self.db.execute('''
+                INSERT INTO Lspells (
+                    name, level, type, Stime, Range, Ref, mov, TimeC, save, target, description, highlevel
+                ) VALUES (
+                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+                )
+            ''',
+            (
+                name, level, type, stime, range, ref, mov, timec, save, target, description, highlevel
+            ))
+            await self.catalog.reload()
+            await ctx.respond(f"呪文 `{name}` を登録しました。")
+        except aiosqlite.IntegrityError:
+            await ctx.respond(f"呪文 `{name}` は既に登録されています。", ephemeral=True)
 
     @commands.slash_command(name="lspellremove", description="呪文を削除します (ホワイトリストユーザーのみ)。")
+    @whitelist_only()
     async def spellremove(self, ctx: discord.ApplicationContext, id: str):
-        glossary_cog = self.bot.get_cog("GlossaryCog")
-        if not glossary_cog or (not await glossary_cog._is_whitelisted(ctx.author.id) and not await glossary_cog._is_admin(ctx.author.id)):
-            await ctx.respond("このコマンドを実行する権限がありません。", ephemeral=True)
-            return
-
-        async with aiosqlite.connect(self.db_path) as db:
+        async def remove(db):
             cursor = await db.execute('DELETE FROM Lspells WHERE ID = ?', (id,))
-            await db.commit()
-            if cursor.rowcount > 0:
-                await ctx.respond(f"ID: `{id}` を削除しました。")
-            else:
-                await ctx.respond(f"ID: `{id}` は見つかりませんでした。", ephemeral=True)
+            await db.execute('DELETE FROM spell_classes WHERE spell_id = ?', (id,))
+            return cursor.rowcount
+
+        if await self.db.transaction(remove) > 0:
+            await self.catalog.reload()
+            await ctx.respond(f"ID: `{id}` を削除しました。")
+        else:
+            await ctx.respond(f"ID: `{id}` は見つかりませんでした。", ephemeral=True)
 
     @commands.slash_command(name="lspellup", description="呪文にクラス対応を追加します (ホワイトリストユーザーのみ)。")
+    @whitelist_only()
     async def spellup(
         self,
         ctx: discord.ApplicationContext,
         class_name: Option(str, description="クラス名 (WIZ, WAR, CRE, SOR, DOR, BRD, PRD, REN, TFS, ISR, PKN)", required=True),
         spell_id: Option(int, description="呪文ID", required=False) = None,
-        spell_name: Option(str, description="呪文名", required=False) = None
+        spell_name: Option(str, description="呪文名", required=False, autocomplete=spell_name_autocomplete('Lspells')) = None
     ):
-        glossary_cog = self.bot.get_cog("GlossaryCog")
-        if not glossary_cog or (not await glossary_cog._is_whitelisted(ctx.author.id) and not await glossary_cog._is_admin(ctx.author.id)):
-            await ctx.respond("このコマンドを実行する権限がありません。", ephemeral=True)
-            return
-
         if spell_id is None and spell_name is None:
             await ctx.respond("呪文IDまたは呪文名を指定してください。", ephemeral=True)
             return
 
-        valid_classes = ["WIZ", "WAR", "CRE", "SOR", "DOR", "BRD", "PRD", "REN", "TFS", "ISR", "PKN"]
-        if class_name.upper() not in valid_classes:
-            await ctx.respond(f"無効なクラス名です。有効なクラス: {', '.join(valid_classes)}", ephemeral=True)
+        class_code = class_name.upper()
+        if class_code not in self.CLASS_CODES:
+            await ctx.respond(f"無効なクラス名です。有効なクラス: {', '.join(self.CLASS_CODES)}", ephemeral=True)
             return
 
-        class_col = class_name.upper()
+        if spell_id is not None:
+            target_spell = f"ID: {spell_id}"
+        else:
+            target_spell = f"名前: {spell_name}"
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async def add_class(db):
             if spell_id is not None:
-                cursor = await db.execute(f'UPDATE Lspells SET {class_col} = ? WHERE ID = ?', ('Y', spell_id))
-                target_spell = f"ID: {spell_id}"
+                cursor = await db.execute('SELECT ID FROM Lspells WHERE ID = ?', (spell_id,))
             else:
-                cursor = await db.execute(f'UPDATE Lspells SET {class_col} = ? WHERE name = ?', ('Y', spell_name))
-                target_spell = f"名前: {spell_name}"
-            
-            await db.commit()
-
-            if cursor.rowcount > 0:
-                await ctx.respond(f"呪文 `{target_spell}` にクラス `{class_col}` を追加しました。")
-            else:
-                await ctx.respond(f"指定された呪文 `{target_spell}` が見つかりませんでした。", ephemeral=True)
+                cursor = await db.execute('SELECT ID FROM Lspells WHERE name = ?', (spell_name,))
+            spell = await cursor.fetchone()
+            if spell is None:
+                return False
+            await db.execute('INSERT OR IGNORE INTO spell_classes (spell_id, class_code) VALUES (?, ?)', (spell[0], class_code))
+            return True
+
+        if await self.db.transaction(add_class):
+            await self.catalog.reload()
+            await ctx.respond(f"呪文 `{target_spell}` にクラス `{class_code}` を追加しました。")
+        else:
+            await ctx.respond(f"指定された呪文 `{target_spell}` が見つかりませんでした。", ephemeral=True)
+
+    @commands.slash_command(name="lspellsync", description="lyres.csv の変更を呪文データベースに反映します (管理者のみ)。")
+    @admin_only()
+    async def lspellsync(self, ctx: discord.ApplicationContext):
+        await ctx.defer(ephemeral=True)
+        result = await self._import_csv_to_db()
+        await self.catalog.reload()
+        if result is None:
+            await ctx.respond("`lyres.csv` が見つかりませんでした。", ephemeral=True)
+            return
+        await ctx.respond(f"同期しました。更新: {result.upserted}件 / 削除: {result.deleted}件 / 変更なし: {result.unchanged}件 / 重複で取り込めず: {result.skipped}件", ephemeral=True)
 
 def setup(bot):
     bot.add_cog(LSpellbookCog(bot))
@@ -3,17 +3,38 @@
 import discord
 from discord.ext import commands, pages
 import aiosqlite
+import bisect
 import os
+from discord.commands import Option
+
+from utils.auth import whitelist_only
+from utils.db import get_pool
+from utils.metrics import metrics
+from utils.name_index import PrefixIndex, SuggestionIndex
+from utils.startup import startup
+from utils.suggestions import SUGGEST_PREFIX, not_found_reply, parse_suggestion_custom_id
+
+@startup.autocomplete
+async def term_autocomplete(ctx: discord.AutocompleteContext):
+    """登録用語を正規化したキーで検索して返す (メモリ上のキャッシュのみを参照)。"""
+    return ctx.cog.term_index.match(ctx.value or '')
 
 class GlossaryCog(commands.Cog):
+    INIT_AFTER = ('WhitelistCog',)
+
     def __init__(self, bot):
         self.bot = bot
         self.db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'glossary.db')
-        self.admin_id = int(os.getenv('ADMIN_ID'))
-        self.bot.loop.create_task(self._async_setup_db()) # 非同期でDBセットアップを呼び出す
-
-    async def _async_setup_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
+        self.db = get_pool(self.db_path)
+        # 用語のキャッシュ (起動時に読み込み、docadd/docremoveで書き込み時に更新する)
+        self.terms = {}
+        self.sorted_terms = []
+        self.term_index = PrefixIndex()
+        self.term_suggestions = SuggestionIndex()
+
+    async def async_init(self):
+        # 起動時に main.py の起動処理から呼ばれる (WhitelistCog の初期化後)
+        async with self.db.write() as db:
             # 用語テーブル
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS terms (
@@ -21,59 +42,49 @@ class GlossaryCog(commands.Cog):
                     description TEXT
                 )
             ''')
-            # ホワイトリストテーブル (GlossaryCogでも参照するため残す)
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS whitelist (
-                    user_id INTEGER PRIMARY KEY
-                )
-            ''')
-            await db.commit()
-
-    async def _is_admin(self, user_id):
-        return user_id == self.admin_id
+        await self._load_terms()
 
-    async def _is_whitelisted(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT 1 FROM whitelist WHERE user_id = ?', (user_id,))
-            result = await cursor.fetchone()
-            return result is not None
+    async def _load_terms(self):
+        rows = await self.db.fetchall('SELECT name, description FROM terms ORDER BY name')
+        self.terms = {row[0]: row[1] for row in rows}
+        self.sorted_terms = [row[0] for row in rows]
+        self.term_index.rebuild(self.sorted_terms)
+        self.term_suggestions.rebuild(self.sorted_terms)
 
     # /docadd コマンド
     @commands.slash_command(name="docadd", description="用語を登録します (ホワイトリストユーザーのみ)。")
+    @whitelist_only()
     async def docadd(self, ctx: discord.ApplicationContext, name: str, description: str):
-        if not await self._is_whitelisted(ctx.author.id) and not await self._is_admin(ctx.author.id):
-            await ctx.respond("このコマンドを実行する権限がありません。", ephemeral=True)
-            return
-
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                await db.execute('INSERT INTO terms (name, description) VALUES (?, ?)', (name, description))
-                await db.commit()
-                await ctx.respond(f"用語 `{name}` を登録しました。")
-            except aiosqlite.IntegrityError:
-                await ctx.respond(f"用語 `{name}` は既に登録されています。", ephemeral=True)
+        try:
+            await self.db.execute('INSERT INTO terms (name, description) VALUES (?, ?)', (name, description))
+            self.terms[name] = description
+            bisect.insort(self.sorted_terms, name)
+            self.term_index.add(name)
+            self.term_suggestions.add(name)
+            await ctx.respond(f"用語 `{name}` を登録しました。")
+        except aiosqlite.IntegrityError:
+            await ctx.respond(f"用語 `{name}` は既に登録されています。", ephemeral=True)
 
     # /docremove コマンド
     @commands.slash_command(name="docremove", description="用語を削除します (ホワイトリストユーザーのみ)。")
-    async def docremove(self, ctx: discord.ApplicationContext, name: str):
-        if not await self._is_whitelisted(ctx.author.id) and not await self._is_admin(ctx.author.id):
-            await ctx.respond("このコマンドを実行する権限がありません。", ephemeral=True)
-            return
-
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('DELETE FROM terms WHERE name = ?', (name,))
-            await db.commit()
-            if cursor.rowcount > 0:
-                await ctx.respond(f"用語 `{name}` を削除しました。")
-            else:
-                await ctx.respond(f"用語 `{name}` は見つかりませんでした。", ephemeral=True)
+    @whitelist_only()
+    async def docremove(self, ctx: discord.ApplicationContext, name: Option(str, description="用語名", autocomplete=term_autocomplete)):
+        cursor = await self.db.execute('DELETE FROM terms WHERE name = ?', (name,))
+        if cursor.rowcount > 0:
+            self.terms.pop(name, None)
+            index = bisect.bisect_left(self.sorted_terms, name)
+            if index < len(self.sorted_terms) and self.sorted_terms[index] == name:
+                del self.sorted_terms[index]
+            self.term_index.remove(name)
+            self.term_suggestions.remove(name)
+            await ctx.respond(f"用語 `{name}` を削除しました。")
+        else:
+            await ctx.respond(f"用語 `{name}` は見つかりませんでした。", ephemeral=True)
 
     # /doclist コマンド
     @commands.slash_command(name="doclist", description="登録されている用語の一覧を表示します。")
     async def doclist(self, ctx: discord.ApplicationContext):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT name FROM terms ORDER BY name')
-            terms = [row[0] for row in await cursor.fetchall()]
+        terms = self.sorted_terms
 
         if not terms:
             await ctx.respond("まだ用語は登録されていません。", ephemeral=True)
@@ -92,16 +103,29 @@ class GlossaryCog(commands.Cog):
 
     # /doc コマンド
     @commands.slash_command(name="doc", description="指定した用語の説明を表示します。")
-    async def doc(self, ctx: discord.ApplicationContext, name: str):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT description FROM terms WHERE name = ?', (name,))
-            result = await cursor.fetchone()
-
-        if result:
-            embed = discord.Embed(title=f"用語: {name}", description=result[0], color=discord.Color.blue())
-            await ctx.respond(embed=embed)
+    async def doc(self, ctx: discord.ApplicationContext, name: Option(str, description="用語名", autocomplete=term_autocomplete)):
+        if name in self.terms:
+            await ctx.respond(embed=self._term_embed(name))
         else:
-            await ctx.respond(f"用語 `{name}` は見つかりませんでした。", ephemeral=True)
+            content, view = not_found_reply(f"用語 `{name}` は見つかりませんでした。", 'term', self.term_suggestions.suggest(name))
+            await ctx.respond(content, view=view, ephemeral=True)
+
+    def _term_embed(self, name: str):
+        return discord.Embed(title=f"用語: {name}", description=self.terms[name], color=discord.Color.blue())
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        # /doc の「もしかして」ボタン
+        if interaction.type != discord.InteractionType.component:
+            return
+        name = parse_suggestion_custom_id(interaction.custom_id, 'term')
+        if name is None or not await startup.admit(interaction, self):
+            return
+        with metrics.measure('component', SUGGEST_PREFIX):
+            if name in self.terms:
+                await interaction.response.send_message(embed=self._term_embed(name))
+            else:
+                await interaction.response.send_message(f"用語 `{name}` は見つかりませんでした。", ephemeral=True)
 
 def setup(bot):
     bot.add_cog(GlossaryCog(bot))
@@ -1,3 +1,4 @@
+import asyncio
 import json
 from pathlib import Path
 
@@ -5,44 +6,12 @@ import discord
 from discord.ext import commands
 from discord.ui import Select, View
 
-# --------------------------------------------------------------------------------
-#  Data load utilities
-# --------------------------------------------------------------------------------
-def _resolve_data_path() -> Path:
-    data_dir = Path(__file__).resolve().parent.parent / 'data'
-    for candidate_name in ('data.json', 'races.json'):
-        candidate = data_dir / candidate_name
-        if candidate.exists():
-            return candidate
-    raise FileNotFoundError('Race data file not found. Expected data.json or races.json in the data directory.')
-
-
-DATA_PATH = _resolve_data_path()
-
-
-def _load_race_data() -> dict:
-    """Load race data from the resolved JSON file."""
-    try:
-        with DATA_PATH.open(encoding='utf-8') as data_file:
-            return json.load(data_file)
-    except json.JSONDecodeError as exc:
-        raise RuntimeError(f'Race data file is invalid JSON: {DATA_PATH}') from exc
-
-
-RACE_DATA = _load_race_data()
-
-# --------------------------------------------------------------------------------
-#  Autocomplete helper
-# --------------------------------------------------------------------------------
-async def race_autocomplete(ctx: discord.AutocompleteContext):
-    """Return race names matching user input for slash command autocomplete."""
-    # 現在入力中の文字を取得
-    user_input = ctx.value.lower()
-    
-    # RACE_DATAのキー（種族名）から、入力中の文字で始まるものを候補として抽出
-    return [
-        race for race in RACE_DATA.keys() if race.lower().startswith(user_input)
-    ]
+from utils.auth import admin_only
+from utils.embed_layout import Field, pack_fields, send_embeds
+from utils.metrics import metrics
+from utils.name_index import PrefixIndex, SuggestionIndex
+from utils.startup import startup
+from utils.suggestions import SUGGEST_PREFIX, not_found_reply, parse_suggestion_custom_id
 
 # --------------------------------------------------------------------------------
 #  Embedを作成するためのヘルパー関数群
@@ -97,13 +66,140 @@ def create_mixed_blood_embed(race_name: str, data: dict) -> discord.Embed:
     return embed
 
 
+# --------------------------------------------------------------------------------
+#  Data load utilities
+#  種族データは派生データ (索引・描画済みEmbed) と一緒に RaceDataset として保持し、
+#  再読み込み時は新しい RaceDataset を丸ごと差し替える
+# --------------------------------------------------------------------------------
+RACE_WATCH_INTERVAL = 5 # 秒。データファイルの更新を確認する間隔
+REQUIRED_KEYS = (
+    'emoji', 'description', 'color', 'basic_info', 'ability_score',
+    'main_traits', 'subraces', 'legacy_traits', 'mixed_blood_traits',
+)
+# 詳細メニューの選択肢とEmbedの作成関数
+DETAIL_PAGES = {
+    "基本概要": create_base_embed,
+    "サブ種族": create_subrace_embed,
+    "レガシー・トレイト": create_legacy_trait_embed,
+    "混血の特性": create_mixed_blood_embed,
+}
+
+
+def _resolve_data_path() -> Path:
+    data_dir = Path(__file__).resolve().parent.parent / 'data'
+    for candidate_name in ('data.json', 'races.json'):
+        candidate = data_dir / candidate_name
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError('Race data file not found. Expected data.json or races.json in the data directory.')
+
+
+def _data_version(path: Path):
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def create_race_list_embeds(data: dict):
+    """種族一覧のEmbedを作成する (種族が多い場合は上限に収まるよう複数に分ける)"""
+    sorted_items = sorted(data.items(), key=lambda item: item[0])
+    lines = [f"{info.get('emoji', '🔹')} {name}" for name, info in sorted_items]
+
+    chunk_size = 10
+    fields = [
+        Field('\u200b', '\n'.join(lines[index:index + chunk_size]), True)
+        for index in range(0, len(lines), chunk_size)
+    ]
+    return pack_fields(
+        fields,
+        "📖 利用可能な種族一覧",
+        color=discord.Color.blue(),
+        description="`/race <種族名>` で詳細を確認できます。",
+        footer=f"合計: {len(lines)}種族"
+    )
+
+
+class RaceDataset:
+    """種族データとその派生データ。作成後は変更しないので、表示中のメニューは作成時の版を参照し続けられる。"""
+
+    def __init__(self, data: dict, path: Path = None, version=None):
+        self.data = data
+        self.path = path
+        self.version = version
+        self.index = PrefixIndex(data.keys())
+        self.suggestions = SuggestionIndex(data.keys())
+        self.embeds = {
+            race_name: {label: build(race_name, race_data) for label, build in DETAIL_PAGES.items()}
+            for race_name, race_data in data.items()
+        }
+        self.list_embeds = create_race_list_embeds(data) if data else []
+
+
+def _load_race_dataset() -> RaceDataset:
+    """Load and validate race data, then build its indexes. Runs off the event loop when reloading."""
+    path = _resolve_data_path()
+    version = _data_version(path)
+    try:
+        with path.open(encoding='utf-8') as data_file:
+            data = json.load(data_file)
+    except json.JSONDecodeError as exc:
+        raise RuntimeError(f'Race data file is invalid JSON: {path}') from exc
+
+    if not isinstance(data, dict):
+        raise RuntimeError(f'Race data file must contain an object keyed by race name: {path}')
+    for race_name, race_data in data.items():
+        if not isinstance(race_data, dict):
+            raise RuntimeError(f'Race data for "{race_name}" must be an object: {path}')
+        missing = [key for key in REQUIRED_KEYS if key not in race_data]
+        if missing:
+            raise RuntimeError(f'Race data for "{race_name}" is missing keys {missing}: {path}')
+
+    try:
+        return RaceDataset(data, path, version)
+    except (AttributeError, KeyError, TypeError, ValueError) as exc:
+        raise RuntimeError(f'Race data file has malformed entries: {path} ({exc})') from exc
+
+
+# 起動直後は空のデータ。ファイルの読み込みはイベントループを止めないよう RaceCog.async_init() で別スレッドで行う
+_dataset = RaceDataset({})
+
+
+def current_races() -> RaceDataset:
+    """現在の種族データ。差し替えられても取得済みの RaceDataset はそのまま使える。"""
+    return _dataset
+
+
+_reload_lock = asyncio.Lock()
+
+
+async def reload_races(only_if_changed: bool = False) -> RaceDataset:
+    """データファイルを別スレッドで読み直して検証し、成功した場合のみ現在の種族データを差し替える。"""
+    global _dataset
+    async with _reload_lock:
+        if only_if_changed:
+            path = _resolve_data_path()
+            if path == _dataset.path and _data_version(path) == _dataset.version:
+                return _dataset
+        _dataset = await asyncio.to_thread(_load_race_dataset)
+        return _dataset
+
+# --------------------------------------------------------------------------------
+#  Autocomplete helper
+# --------------------------------------------------------------------------------
+@startup.autocomplete
+async def race_autocomplete(ctx: discord.AutocompleteContext):
+    """Return race names matching user input for slash command autocomplete."""
+    # 前方一致・部分一致の候補を順位付けして最大25件返す
+    return current_races().index.match(ctx.value or '')
+
 # --------------------------------------------------------------------------------
 #  UIコンポーネント (ドロップダウンメニュー)
 # --------------------------------------------------------------------------------
 class RaceInfoSelect(Select):
-    def __init__(self, race_name: str):
+    def __init__(self, race_name: str, dataset: RaceDataset):
+        # 表示中に種族データが再読み込みされても、作成時の版で応答する
         self.race_name = race_name
-        self.race_data = RACE_DATA[race_name]
+        self.dataset = dataset
+        self.race_data = dataset.data[race_name]
 
         options = [
             discord.SelectOption(label="基本概要", description=f"{race_name}の基本情報を表示", emoji=self.race_data['emoji']),
@@ -115,26 +211,20 @@ class RaceInfoSelect(Select):
 
     async def callback(self, interaction: discord.Interaction):
         selection = self.values[0]
-        
-        if selection == "基本概要":
-            new_embed = create_base_embed(self.race_name, self.race_data)
-        elif selection == "サブ種族":
-            new_embed = create_subrace_embed(self.race_name, self.race_data)
-        elif selection == "レガシー・トレイト":
-            new_embed = create_legacy_trait_embed(self.race_name, self.race_data)
-        elif selection == "混血の特性":
-            new_embed = create_mixed_blood_embed(self.race_name, self.race_data)
-        else:
-            await interaction.response.send_message("エラーが発生しました。", ephemeral=True)
-            return
 
-        await interaction.response.edit_message(embed=new_embed)
+        with metrics.measure('component', 'race_select'):
+            new_embed = self.dataset.embeds[self.race_name].get(selection)
+            if new_embed is None:
+                await interaction.response.send_message("エラーが発生しました。", ephemeral=True)
+                return
+
+            await interaction.response.edit_message(embed=new_embed)
 
 
 class RaceInfoView(View):
-    def __init__(self, race_name: str):
+    def __init__(self, race_name: str, dataset: RaceDataset):
         super().__init__(timeout=180)
-        self.add_item(RaceInfoSelect(race_name))
+        self.add_item(RaceInfoSelect(race_name, dataset))
 
 
 # --------------------------------------------------------------------------------
@@ -143,6 +233,56 @@ class RaceInfoView(View):
 class RaceCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self._watcher = None
+
+    async def async_init(self):
+        # 起動時に main.py の起動処理から呼ばれる。読み込み後にデータファイルの更新の監視を始める
+        # データファイルがなければ空のデータのまま起動し、後から置かれたファイルを監視で読み込む
+        missing = None
+        try:
+            await reload_races()
+        except FileNotFoundError as exc:
+            missing = str(exc)
+            print(f"種族データのファイルがないため、空のデータで起動します: {exc}")
+        self._watcher = asyncio.create_task(self._watch_race_data(last_error=missing))
+
+    def cog_unload(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        # /race の「もしかして」ボタン
+        if interaction.type != discord.InteractionType.component:
+            return
+        race_name = parse_suggestion_custom_id(interaction.custom_id, 'race')
+        if race_name is None or not await startup.admit(interaction, self):
+            return
+        with metrics.measure('component', SUGGEST_PREFIX):
+            dataset = current_races()
+            if race_name not in dataset.data:
+                await interaction.response.send_message(f"指定された種族「{race_name}」は見つかりませんでした。", ephemeral=True)
+                return
+            await interaction.response.send_message(
+                embed=dataset.embeds[race_name]["基本概要"], view=RaceInfoView(race_name, dataset)
+            )
+
+    async def _watch_race_data(self, last_error: str = None):
+        """データファイルの更新日時を定期的に確認し、変更されていれば読み直す。"""
+        while True:
+            await asyncio.sleep(RACE_WATCH_INTERVAL)
+            previous = current_races()
+            try:
+                dataset = await reload_races(only_if_changed=True)
+            except (OSError, RuntimeError) as exc:
+                # 壊れたファイルは読み込まず、直前のデータで動作を続ける (同じエラーは一度だけ表示する)
+                if str(exc) != last_error:
+                    print(f"種族データの再読み込みに失敗しました: {exc}")
+                    last_error = str(exc)
+                continue
+            last_error = None
+            if dataset is not previous:
+                print(f"種族データを再読み込みしました ({len(dataset.data)}種族): {dataset.path}")
 
     # ▼▼▼ コマンドの定義を修正 ▼▼▼
     @commands.slash_command(name="race", description="種族の詳細情報を表示します。")
@@ -157,14 +297,16 @@ class RaceCog(commands.Cog):
         )
     ):
         """種族の基本情報と詳細オプションを表示するコマンド"""
-        if race_name not in RACE_DATA:
-            await ctx.respond(f"指定された種族「{race_name}」は見つかりませんでした。", ephemeral=True)
+        dataset = current_races()
+        if race_name not in dataset.data:
+            content, view = not_found_reply(
+                f"指定された種族「{race_name}」は見つかりませんでした。", 'race', dataset.suggestions.suggest(race_name)
+            )
+            await ctx.respond(content, view=view, ephemeral=True)
             return
 
-        race_data = RACE_DATA[race_name]
-        
-        initial_embed = create_base_embed(race_name, race_data)
-        view = RaceInfoView(race_name)
+        initial_embed = dataset.embeds[race_name]["基本概要"]
+        view = RaceInfoView(race_name, dataset)
         
         await ctx.respond(embed=initial_embed, view=view)
         
@@ -172,27 +314,24 @@ class RaceCog(commands.Cog):
     @commands.slash_command(name="racelist", description="利用可能な全ての種族を一覧表示します。")
     async def racelist(self, ctx: discord.ApplicationContext):
         """Display the list of available races with their emoji."""
-        if not RACE_DATA:
+        dataset = current_races()
+        if not dataset.data:
             await ctx.respond("利用可能な種族データが見つかりません。", ephemeral=True)
             return
 
-        sorted_items = sorted(RACE_DATA.items(), key=lambda item: item[0])
-        lines = [f"{info.get('emoji', '🔹')} {name}" for name, info in sorted_items]
-
-        embed = discord.Embed(
-            title="📖 利用可能な種族一覧",
-            description="`/race <種族名>` で詳細を確認できます。",
-            color=discord.Color.blue()
-        )
-
-        chunk_size = 10
-        for index in range(0, len(lines), chunk_size):
-            chunk = lines[index:index + chunk_size]
-            embed.add_field(name='\u200b', value='\n'.join(chunk), inline=True)
-
-        embed.set_footer(text=f"合計: {len(lines)}種族")
-
-        await ctx.respond(embed=embed, ephemeral=True)
+        await send_embeds(ctx.respond, dataset.list_embeds, ephemeral=True)
+
+    @commands.slash_command(name="racereload", description="種族データを再読み込みします (管理者のみ)。")
+    @admin_only()
+    async def racereload(self, ctx: discord.ApplicationContext):
+        """データファイルを読み直し、索引と表示用のEmbedを作り直す"""
+        await ctx.defer(ephemeral=True)
+        try:
+            dataset = await reload_races()
+        except (OSError, RuntimeError) as exc:
+            await ctx.respond(f"種族データの再読み込みに失敗しました。現在のデータを使い続けます。\n{exc}", ephemeral=True)
+            return
+        await ctx.respond(f"種族データを再読み込みしました ({len(dataset.data)}種族)。", ephemeral=True)
 
 
 # CogをBOTに登録するための必須関数
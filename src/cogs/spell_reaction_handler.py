@@ -1,77 +1,140 @@
 import discord
 from discord.ext import commands
-import asyncio
+
+from utils.catalog import get_catalog
+from utils.metrics import metrics
+from utils.notify import dm_notifier
+from utils.spell_messages import SPELL_SET_PREFIX, SPELL_SET_TOGGLE, parse_footer, parse_spell_set_custom_id, spell_messages
+from utils.startup import startup
+
+# 呪文テーブルと、その呪文セットを管理するCogの対応
+SPELL_SET_COGS = {'spells': 'UserSpellSetsCog', 'Lspells': 'LUserSpellSetsCog'}
 
 class SpellReactionHandlerCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def _get_spell_message(self, payload: discord.RawReactionActionEvent):
+        """リアクションされたメッセージに表示されている呪文を返す。呪文一覧でなければ None。"""
+        # ページ送りのたびに更新している索引 → クライアントのキャッシュ → REST の順に参照する
+        entry = spell_messages.get(payload.message_id)
+        if entry is not None:
+            return entry
+
+        message = self.bot.get_message(payload.message_id)
+        if message is None:
+            try:
+                channel = self.bot.get_partial_messageable(payload.channel_id)
+                message = await channel.fetch_message(payload.message_id)
+            except discord.HTTPException:
+                return None
+        if message.author.id != self.bot.user.id or not message.embeds or not message.embeds[0].footer:
+            return None
+
+        entry = parse_footer(message.embeds[0].footer.text)
+        if entry is not None:
+            spell_messages.remember(payload.message_id, entry.table, entry.spell_ids)
+        return entry
+
+    async def _remove_reaction(self, payload: discord.RawReactionActionEvent):
+        message = self.bot.get_partial_messageable(payload.channel_id).get_partial_message(payload.message_id)
+        try:
+            await message.remove_reaction(payload.emoji, discord.Object(payload.user_id))
+        except discord.HTTPException: # ボットにリアクション削除権限がない場合 (DMなど)
+            pass
+
+    async def _toggle_spell(self, table: str, user_id: int, spell_id: int, action: str = SPELL_SET_TOGGLE):
+        """呪文セットへの追加・削除を切り替え (action が 'add' / 'remove' ならその操作のみ行い)、利用者に伝える文を返す。
+        呪文セットのCogがない場合は None。
+        """
+        user_spell_sets_cog = self.bot.get_cog(SPELL_SET_COGS[table])
+        if not user_spell_sets_cog:
+            print(f"Error: {SPELL_SET_COGS[table]} not found.")
+            return None
+
+        # 呪文名はメモリ上のカタログから引く
+        catalog = get_catalog(table)
+        if catalog.loaded:
+            spell = catalog.get(spell_id)
+        else:
+            spell, _ = await user_spell_sets_cog.get_spell_by_query(str(spell_id))
+        if not spell:
+            return f"エラー: ID {spell_id} の呪文が見つかりませんでした。"
+
+        # /setspell・/unsetspell の候補ボタンは、押した時点の登録状態にかかわらず指定された操作だけを行う
+        if action == 'add':
+            if await user_spell_sets_cog.add_spell_to_user_set(user_id, spell_id):
+                return f"あなたの呪文セットに '{spell['name']}' を追加しました。"
+            return f"'{spell['name']}' は既にあなたの呪文セットに登録されています。"
+        if action == 'remove':
+            if await user_spell_sets_cog.remove_spell_from_user_set(user_id, spell_id):
+                return f"あなたの呪文セットから '{spell['name']}' を削除しました。"
+            return f"'{spell['name']}' はあなたの呪文セットに登録されていません。"
+
+        # 追加・削除を1回の書き込みで切り替え、操作後の状態を受け取る
+        if await user_spell_sets_cog.toggle_spell_in_user_set(user_id, spell_id):
+            return f"あなたの呪文セットに '{spell['name']}' を追加しました。"
+        return f"あなたの呪文セットから '{spell['name']}' を削除しました。"
+
     @commands.Cog.listener()
-    async def on_reaction_add(self, reaction, user):
-        # ボット自身のリアクションやDMでのリアクションは無視
-        if user.bot:
+    async def on_interaction(self, interaction: discord.Interaction):
+        # 呪文一覧の番号ボタン。custom_idだけで処理するので、どのページ・古いメッセージでも応答できる
+        if interaction.type != discord.InteractionType.component:
+            return
+        parsed = parse_spell_set_custom_id(interaction.custom_id or '')
+        if parsed is None:
             return
 
-        # メッセージにEmbedがあり、フッターに情報が含まれているか確認
-        if not reaction.message.embeds or not reaction.message.embeds[0].footer or not reaction.message.embeds[0].footer.text.startswith("spell_ids:"):
+        action, table, spell_id = parsed
+        if not await startup.admit(interaction, SPELL_SET_COGS[table]):
             return
+        target = (table, spell_id)
+        with metrics.measure('component', SPELL_SET_PREFIX):
+            if dm_notifier.is_duplicate(interaction.user.id, target):
+                await interaction.response.send_message("続けて押されたため、2回目の操作は無視しました。", ephemeral=True)
+                return
+            notice = await self._toggle_spell(table, interaction.user.id, spell_id, action)
+            await interaction.response.send_message(notice or "エラーが発生しました。", ephemeral=True)
 
-        try:
-            spell_ids_str = reaction.message.embeds[0].footer.text.split(":")[1]
-            spell_ids_on_page = [int(id) for id in spell_ids_str.split(",")]
-        except (IndexError, ValueError):
-            return # フッターの形式が不正な場合は無視
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        # 番号ボタン導入前のリアクション付きメッセージ用。キャッシュにない古いメッセージでも受け取れるよう、生のイベントを使う
+        # ボット自身のリアクションは無視
+        if payload.user_id == self.bot.user.id or (payload.member is not None and payload.member.bot):
+            return
 
         emojis = {"1️⃣": 0, "2️⃣": 1, "3️⃣": 2, "4️⃣": 3, "5️⃣": 4, "6️⃣": 5}
 
         # 有効な絵文字か確認
-        if str(reaction.emoji) not in emojis:
+        index = emojis.get(str(payload.emoji))
+        if index is None:
             return
 
-        index = emojis[str(reaction.emoji)]
-
-        # 絵文字が指す呪文がリストの範囲内か確認
-        if index >= len(spell_ids_on_page):
-            await reaction.remove(user) # 無効なリアクションは削除
+        entry = await self._get_spell_message(payload)
+        if entry is None:
             return
-
-        target_spell_id = spell_ids_on_page[index]
-
-        user_spell_sets_cog = self.bot.get_cog("UserSpellSetsCog")
-        if not user_spell_sets_cog:
-            print("Error: UserSpellSetsCog not found.")
-            await reaction.remove(user)
+        # 起動処理中や呪文セットのCogの初期化に失敗している場合は、リアクションを残したまま何もしない
+        if not startup.available(SPELL_SET_COGS[entry.table]):
             return
 
-        # 呪文の詳細情報を取得
-        spell = await user_spell_sets_cog.get_spell_by_query(str(target_spell_id))
-        if not spell:
-            await user.send(f"エラー: ID {target_spell_id} の呪文が見つかりませんでした。")
-            await reaction.remove(user)
+        # 絵文字が指す呪文がリストの範囲内か確認
+        if index >= len(entry.spell_ids):
+            await self._remove_reaction(payload) # 無効なリアクションは削除
             return
 
-        # ユーザーの現在の呪文セットを取得
-        current_user_spells = await user_spell_sets_cog.get_user_spell_set_spells(user.id)
-        spell_in_set = any(s['ID'] == target_spell_id for s in current_user_spells)
+        target_spell_id = entry.spell_ids[index]
+
+        # 二重押しはDBに触れずに無視し、通知は短時間の変更をまとめて1通のDMで送る
+        target = (entry.table, target_spell_id)
+        if not dm_notifier.is_duplicate(payload.user_id, target):
+            with metrics.measure('component', 'reaction'):
+                notice = await self._toggle_spell(entry.table, payload.user_id, target_spell_id)
+                if notice is not None:
+                    user = payload.member or self.bot.get_user(payload.user_id) or await self.bot.fetch_user(payload.user_id)
+                    dm_notifier.push(user, target, notice)
 
-        if spell_in_set:
-            # 既にセットにあれば削除
-            if await user_spell_sets_cog.remove_spell_from_user_set(user.id, target_spell_id):
-                await user.send(f"あなたの呪文セットから '{spell['name']}' を削除しました。")
-            else:
-                await user.send(f"エラー: '{spell['name']}' をあなたの呪文セットから削除できませんでした。")
-        else:
-            # セットになければ追加
-            if await user_spell_sets_cog.add_spell_to_user_set(user.id, target_spell_id):
-                await user.send(f"あなたの呪文セットに '{spell['name']}' を追加しました。")
-            else:
-                await user.send(f"エラー: '{spell['name']}' をあなたの呪文セットに追加できませんでした。")
-        
         # ユーザーのリアクションを削除
-        try:
-            await reaction.remove(user)
-        except discord.Forbidden: # ボットにリアクション削除権限がない場合
-            pass
+        await self._remove_reaction(payload)
 
 def setup(bot):
-    bot.add_cog(SpellReactionHandlerCog(bot))
\ No newline at end of file
+    bot.add_cog(SpellReactionHandlerCog(bot))
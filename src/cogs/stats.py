@@ -0,0 +1,112 @@
+import asyncio
+
+import discord
+from discord.ext import commands
+
+from utils.auth import admin_only
+from utils.db import write_stats
+from utils.embed_layout import Field, pack_fields, send_embeds
+from utils.metrics import metrics
+from utils.notify import dm_notifier
+from utils.query_profile import query_profiler
+from utils.render_cache import render_cache
+
+class StatsCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self._snapshots = None
+
+    async def async_init(self):
+        # 起動時に main.py の起動処理から呼ばれる。計測値を定期的にファイルへ書き出す
+        self._snapshots = asyncio.create_task(metrics.write_snapshots())
+
+    def cog_unload(self):
+        if self._snapshots is not None:
+            self._snapshots.cancel()
+
+    @commands.slash_command(name="stats", description="コマンドの実行回数と所要時間を表示します (管理者のみ)。")
+    @admin_only()
+    async def stats(self, ctx: discord.ApplicationContext):
+        snapshot = metrics.snapshot()
+
+        fields = []
+        for kind, label in (('command', '/'), ('component', '🔘 ')):
+            # 実行回数の多い順
+            for name, summary in sorted(snapshot.get(kind, {}).items(), key=lambda item: -item[1]['count']):
+                fields.append(Field(
+                    f"{label}{name}",
+                    f"回数: {summary['count']} / エラー: {summary['errors']}\n"
+                    f"p50: {summary['p50_ms']:.1f}ms / p95: {summary['p95_ms']:.1f}ms\n"
+                    f"p99: {summary['p99_ms']:.1f}ms / 最大: {summary['max_ms']:.1f}ms",
+                    True
+                ))
+        if not fields:
+            fields.append(Field("計測値", "まだ記録されていません。", False))
+
+        cache = render_cache.stats()
+        fields.append(Field(
+            "描画キャッシュ",
+            f"ヒット率: {cache['hit_rate']:.1%} ({cache['hits']}/{cache['hits'] + cache['misses']}) / 件数: {cache['size']}",
+            False
+        ))
+        notices = dm_notifier.stats()
+        fields.append(Field(
+            "DM通知",
+            f"送信: {notices['sent']} / まとめた件数: {notices['coalesced']} / 二重押し: {notices['deduped']} / 失敗: {notices['failed']}",
+            False
+        ))
+        writers = write_stats()
+        if writers:
+            fields.append(Field(
+                "DB書き込み",
+                "\n".join(
+                    f"{name}: {stats['writes']}件 / {stats['batches']}バッチ (平均 {stats['avg_batch_size']:.1f}件)"
+                    for name, stats in writers.items()
+                ),
+                False
+            ))
+
+        embeds = pack_fields(
+            fields,
+            "📊 実行統計",
+            color=discord.Color.dark_teal(),
+            footer=f"起動から {snapshot['uptime_seconds'] / 3600:.1f}時間"
+        )
+        await send_embeds(ctx.respond, embeds, ephemeral=True)
+
+    @commands.slash_command(name="querystats", description="SQLの形ごとの実行回数・所要時間と遅いクエリを表示します (管理者のみ)。")
+    @admin_only()
+    async def querystats(self, ctx: discord.ApplicationContext):
+        fields = []
+        # 合計所要時間の長い順
+        for (db_name, shape), stats in query_profiler.top():
+            warning = " ⚠️全件走査" if stats.full_scan else ""
+            fields.append(Field(
+                f"{db_name}{warning}",
+                f"```sql\n{shape[:700]}\n```"
+                f"回数: {stats.count} / 合計: {stats.total * 1000:.1f}ms / "
+                f"平均: {stats.total / stats.count * 1000:.2f}ms / 最大: {stats.max * 1000:.1f}ms / "
+                f"平均行数: {stats.rows / stats.count:.1f}",
+                False
+            ))
+        if not fields:
+            fields.append(Field("計測値", "まだ記録されていません。", False))
+
+        for entry in list(query_profiler.slow_queries)[-5:]:
+            plan = "\n".join(entry['plan']) or "(プランなし)"
+            fields.append(Field(
+                f"🐢 {entry['at']} {entry['elapsed_ms']:.1f}ms ({entry['db']})",
+                f"```sql\n{entry['sql'][:500]}\n```{plan[:400]}",
+                False
+            ))
+
+        embeds = pack_fields(
+            fields,
+            "🗃️ クエリ統計",
+            color=discord.Color.dark_teal(),
+            footer=f"遅いクエリ: {query_profiler.slow_count}件 (閾値 {query_profiler.threshold * 1000:.0f}ms)"
+        )
+        await send_embeds(ctx.respond, embeds, ephemeral=True)
+
+def setup(bot):
+    bot.add_cog(StatsCog(bot))
@@ -2,15 +2,25 @@ import discord
 from discord.ext import commands
 import aiosqlite
 import os
+from discord.commands import Option
+
+from utils.catalog import get_catalog, spell_name_autocomplete
+from utils.db import get_pool
+from utils.embed_layout import Field, pack_fields, send_embeds
+from utils.spell_messages import spell_choice_prompt
 
 class UserSpellSetsCog(commands.Cog):
+    INIT_AFTER = ('SpellbookCog',)
+
     def __init__(self, bot):
         self.bot = bot
         self.db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'spells.db')
-        self.bot.loop.create_task(self._async_setup_db())
+        self.db = get_pool(self.db_path)
+        self.catalog = get_catalog('spells')
 
-    async def _async_setup_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
+    async def async_init(self):
+        # 起動時に main.py の起動処理から呼ばれる (SpellbookCog の初期化後)
+        async with self.db.write() as db:
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS user_spell_sets (
                     user_id INTEGER NOT NULL,
@@ -19,57 +29,64 @@ class UserSpellSetsCog(commands.Cog):
                     FOREIGN KEY (spell_id) REFERENCES spells(ID) ON DELETE CASCADE
                 )
             ''')
-            await db.commit()
 
     async def get_spell_by_query(self, query: str):
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            # 最初にIDで検索を試みる
-            if query.isdigit():
-                cursor = await db.execute('SELECT * FROM spells WHERE ID = ?', (int(query),))
-                spell = await cursor.fetchone()
-                if spell: return spell
-            # IDで見つからなければ名前で検索
-            cursor = await db.execute('SELECT * FROM spells WHERE name LIKE ?', (f'%{query}%',))
-            spell = await cursor.fetchone()
-            return spell
+        """query に一致する呪文を (呪文, 候補) で返す。名前が紛らわしい場合は呪文が None で、候補に選択肢が入る。"""
+        # 最初にIDで検索を試みる
+        if query.isdigit():
+            spell = await self.db.fetchone('SELECT * FROM spells WHERE ID = ?', (int(query),))
+            if spell: return spell, []
+        # オートコンプリートで選ばれた名前は完全一致で探す
+        spell = await self.db.fetchone('SELECT * FROM spells WHERE name = ?', (query,))
+        if spell: return spell, []
+        # 見つからなければ名前のn-gramの類似度で探す (表記揺れや誤字も拾う)
+        if self.catalog.loaded:
+            return self.catalog.lookup(query)
+        # カタログの読み込み前は名前の部分一致 (短い名前を優先)
+        spell = await self.db.fetchone('SELECT * FROM spells WHERE name LIKE ? ORDER BY length(name), ID', (f'%{query}%',))
+        return spell, []
 
     async def add_spell_to_user_set(self, user_id: int, spell_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                await db.execute('INSERT INTO user_spell_sets (user_id, spell_id) VALUES (?, ?)', (user_id, spell_id,))
-                await db.commit()
-                return True
-            except aiosqlite.IntegrityError:
-                return False # 既に存在する場合
+        try:
+            await self.db.execute('INSERT INTO user_spell_sets (user_id, spell_id) VALUES (?, ?)', (user_id, spell_id,))
+            return True
+        except aiosqlite.IntegrityError:
+            return False # 既に存在する場合
 
     async def remove_spell_from_user_set(self, user_id: int, spell_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
+        cursor = await self.db.execute('DELETE FROM user_spell_sets WHERE user_id = ? AND spell_id = ?', (user_id, spell_id,))
+        return cursor.rowcount > 0
+
+    async def toggle_spell_in_user_set(self, user_id: int, spell_id: int):
+        """呪文セットに含まれていれば削除、なければ追加し、操作後にセットに含まれているかを返す。"""
+        async def toggle(db):
+            # 削除できなければ未登録なので追加する (同じトランザクション内で判定するため競合しない)
             cursor = await db.execute('DELETE FROM user_spell_sets WHERE user_id = ? AND spell_id = ?', (user_id, spell_id,))
-            await db.commit()
-            return cursor.rowcount > 0
+            if cursor.rowcount > 0:
+                return False
+            await db.execute('INSERT INTO user_spell_sets (user_id, spell_id) VALUES (?, ?)', (user_id, spell_id,))
+            return True
+        return await self.db.transaction(toggle)
 
     async def reset_user_spell_set(self, user_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('DELETE FROM user_spell_sets WHERE user_id = ?', (user_id,))
-            await db.commit()
-            return cursor.rowcount > 0
+        cursor = await self.db.execute('DELETE FROM user_spell_sets WHERE user_id = ?', (user_id,))
+        return cursor.rowcount > 0
 
     async def get_user_spell_set_spells(self, user_id: int):
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute('''
-                SELECT s.* FROM spells s
-                JOIN user_spell_sets uss ON s.ID = uss.spell_id
-                WHERE uss.user_id = ?
-                ORDER BY s.level, s.name
-            ''', (user_id,))
-            spells = await cursor.fetchall()
-            return spells
+        return await self.db.fetchall('''
+            SELECT s.* FROM spells s
+            JOIN user_spell_sets uss ON s.ID = uss.spell_id
+            WHERE uss.user_id = ?
+            ORDER BY s.level, s.name
+        ''', (user_id,))
 
     @commands.slash_command(name="setspell", description="あなたの呪文セットに呪文を追加します。")
-    async def setspell(self, ctx: discord.ApplicationContext, query: str):
-        spell = await self.get_spell_by_query(query)
+    async def setspell(self, ctx: discord.ApplicationContext, query: Option(str, description="呪文名またはID", autocomplete=spell_name_autocomplete('spells'))):
+        spell, candidates = await self.get_spell_by_query(query)
+        if candidates:
+            embed, view = spell_choice_prompt('spells', query, candidates, 'add')
+            await ctx.respond(embed=embed, view=view, ephemeral=True)
+            return
         if not spell:
             await ctx.respond(f"'{query}' に一致する呪文は見つかりませんでした。", ephemeral=True)
             return
@@ -80,8 +97,12 @@ class UserSpellSetsCog(commands.Cog):
             await ctx.respond(f"呪文 '{spell['name']}' は既にあなたの呪文セットに登録されています。", ephemeral=True)
 
     @commands.slash_command(name="unsetspell", description="あなたの呪文セットから呪文を削除します。")
-    async def unsetspell(self, ctx: discord.ApplicationContext, query: str):
-        spell = await self.get_spell_by_query(query)
+    async def unsetspell(self, ctx: discord.ApplicationContext, query: Option(str, description="呪文名またはID", autocomplete=spell_name_autocomplete('spells'))):
+        spell, candidates = await self.get_spell_by_query(query)
+        if candidates:
+            embed, view = spell_choice_prompt('spells', query, candidates, 'remove')
+            await ctx.respond(embed=embed, view=view, ephemeral=True)
+            return
         if not spell:
             await ctx.respond(f"'{query}' に一致する呪文は見つかりませんでした。", ephemeral=True)
             return
@@ -106,8 +127,6 @@ class UserSpellSetsCog(commands.Cog):
             await ctx.respond("あなたの呪文セットは空です。DMを確認してください。", ephemeral=True)
             return
 
-        embed = discord.Embed(title=f"{ctx.author.display_name} の呪文セット", color=discord.Color.purple())
-
         display_fields = {
             'ID': 'ID',
             'name': '名前',
@@ -123,6 +142,7 @@ class UserSpellSetsCog(commands.Cog):
             'highlevel': '高レベル化'
         }
 
+        fields = []
         for spell in spells:
             spell_info = []
             for key, display_name in display_fields.items():
@@ -133,20 +153,17 @@ class UserSpellSetsCog(commands.Cog):
             if len(description) > 200: # 埋め込みフィールドの文字数制限を考慮
                 description = description[:197] + "..."
 
-            embed.add_field(
-                name=f"***{spell['name']} (ID: {spell['ID']})***",
-                value="\n".join(spell_info) + f"\n**説明**: {description}\n--------------------",
-                inline=False
-            )
-        
-        # Discordの埋め込みの合計文字数制限 (6000文字) を考慮
-        # 必要であれば、ここで複数の埋め込みに分割するロジックを追加することも可能ですが、
-        # 今回は「ページングせずに１つの埋め込み表示ににまとめて」という要望なので、
-        # 制限を超える場合は途中で切れる可能性があります。
-        # ユーザーの呪文セットの呪文数が多い場合は注意が必要です。
+            fields.append(Field(
+                f"***{spell['name']} (ID: {spell['ID']})***",
+                "\n".join(spell_info) + f"\n**説明**: {description}\n--------------------",
+                False
+            ))
 
+        # ページングはせず、Discordの上限 (25フィールド・合計6000文字・1メッセージ10件) に収まるよう
+        # できるだけ少ないEmbedとメッセージに分けてDMで送る
+        embeds = pack_fields(fields, f"{ctx.author.display_name} の呪文セット", color=discord.Color.purple())
         try:
-            await ctx.author.send(embed=embed)
+            await send_embeds(ctx.author.send, embeds)
             await ctx.respond("あなたの呪文セットをDMに送信しました。", ephemeral=True)
         except discord.Forbidden:
             await ctx.respond("DMを送信できませんでした。プライバシー設定を確認してください。", ephemeral=True)
@@ -1,85 +1,71 @@
 
 
 import discord
-from discord.ext import commands
-import aiosqlite
+from discord.ext import commands, pages
 import os
 
+from utils.auth import admin_only, authorizer
+from utils.db import get_pool
+from utils.user_names import UserNameResolver
+
 class WhitelistCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'glossary.db') # glossary.dbを共有
-        self.admin_id = int(os.getenv('ADMIN_ID'))
-        self.bot.loop.create_task(self._async_setup_db()) # 非同期でDBセットアップを呼び出す
-
-    async def _async_setup_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            # ホワイトリストテーブル
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS whitelist (
-                    user_id INTEGER PRIMARY KEY
-                )
-            ''')
-            await db.commit()
+        self.db = get_pool(self.db_path)
+        self.user_names = UserNameResolver(bot, self.db)
+        # ADMIN_ID の不備はコマンドの実行時ではなく、Cogの読み込み時にエラーにする
+        authorizer.load_admin_id()
 
-    async def _is_admin(self, user_id):
-        return user_id == self.admin_id
+    async def async_init(self):
+        # 起動時に main.py の起動処理から呼ばれる
+        # ホワイトリストテーブルの作成とメモリへの読み込み
+        await authorizer.load()
+        await self.user_names.setup()
 
     # ホワイトリスト管理コマンドグループ
     whitelist = discord.SlashCommandGroup("whitelist", "ホワイトリスト管理コマンド (管理者のみ)。")
 
     @whitelist.command(name="add", description="ユーザーをホワイトリストに追加します (管理者のみ)。")
+    @admin_only()
     async def whitelist_add(self, ctx: discord.ApplicationContext, user: discord.User):
-        if not await self._is_admin(ctx.author.id):
-            await ctx.respond("このコマンドを実行する権限がありません。", ephemeral=True)
-            return
-
-        async with aiosqlite.connect(self.db_path) as db:
-            try:
-                await db.execute('INSERT INTO whitelist (user_id) VALUES (?)', (user.id,))
-                await db.commit()
-                await ctx.respond(f"ユーザー `{user.name}` をホワイトリストに追加しました。")
-            except aiosqlite.IntegrityError:
-                await ctx.respond(f"ユーザー `{user.name}` は既にホワイトリストに登録されています。", ephemeral=True)
+        if await authorizer.add(user.id):
+            await ctx.respond(f"ユーザー `{user.name}` をホワイトリストに追加しました。")
+        else:
+            await ctx.respond(f"ユーザー `{user.name}` は既にホワイトリストに登録されています。", ephemeral=True)
 
     @whitelist.command(name="remove", description="ユーザーをホワイトリストから削除します (管理者のみ)。")
+    @admin_only()
     async def whitelist_remove(self, ctx: discord.ApplicationContext, user: discord.User):
-        if not await self._is_admin(ctx.author.id):
-            await ctx.respond("このコマンドを実行する権限がありません。", ephemeral=True)
-            return
-
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('DELETE FROM whitelist WHERE user_id = ?', (user.id,))
-            await db.commit()
-            if cursor.rowcount > 0:
-                await ctx.respond(f"ユーザー `{user.name}` をホワイトリストから削除しました。")
-            else:
-                await ctx.respond(f"ユーザー `{user.name}` はホワイトリストに登録されていません。", ephemeral=True)
+        if await authorizer.remove(user.id):
+            await ctx.respond(f"ユーザー `{user.name}` をホワイトリストから削除しました。")
+        else:
+            await ctx.respond(f"ユーザー `{user.name}` はホワイトリストに登録されていません。", ephemeral=True)
 
     @whitelist.command(name="list", description="ホワイトリストに登録されているユーザーを表示します (管理者のみ)。")
+    @admin_only()
     async def whitelist_list(self, ctx: discord.ApplicationContext):
-        if not await self._is_admin(ctx.author.id):
-            await ctx.respond("このコマンドを実行する権限がありません。", ephemeral=True)
-            return
-
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('SELECT user_id FROM whitelist')
-            user_ids = [row[0] for row in await cursor.fetchall()]
+        await authorizer.ensure_loaded()
+        user_ids = sorted(authorizer.whitelist)
 
         if not user_ids:
             await ctx.respond("ホワイトリストにユーザーは登録されていません。", ephemeral=True)
             return
 
-        users = []
-        for user_id in user_ids:
-            try:
-                user = await self.bot.fetch_user(user_id)
-                users.append(user.name)
-            except discord.NotFound:
-                users.append(f"不明なユーザー (ID: {user_id})")
+        # 名前の取得にREST呼び出しが必要になる場合があるため先に応答を保留する
+        await ctx.defer()
+        names = await self.user_names.resolve(user_ids)
+        users = [names[user_id] for user_id in user_ids]
+
+        # ページネーション
+        chunked_users = [users[i:i + 20] for i in range(0, len(users), 20)] # 1ページ20件
+        embeds = []
+        for i, chunk in enumerate(chunked_users):
+            embed = discord.Embed(title=f"ホワイトリストユーザー ({i+1}/{len(chunked_users)})", description="\n".join(chunk), color=discord.Color.blue())
+            embeds.append(embed)
 
-        embed = discord.Embed(title="ホワイトリストユーザー", description="\n".join(users), color=discord.Color.blue())
-        await ctx.respond(embed=embed)
+        paginator = pages.Paginator(pages=embeds)
+        await paginator.respond(ctx.interaction, ephemeral=False)
 
 def setup(bot):
     bot.add_cog(WhitelistCog(bot))
@@ -1,15 +1,51 @@
+import asyncio
 import discord
 import os
+import sys
+import traceback
 from dotenv import load_dotenv
 
+from utils.auth import NotAuthorized
+from utils.db import close_all
+from utils.metrics import metrics
+from utils.notify import dm_notifier
+from utils.startup import InitFailed, WarmingUp, startup
+
 load_dotenv()
 
-bot = discord.Bot()
+class SpellBot(discord.Bot):
+    async def start(self, token, *, reconnect=True):
+        # 各CogのDB準備・データ読み込みをゲートウェイへの接続と並行して行う
+        self.startup_task = asyncio.create_task(startup.run(self))
+        await super().start(token, reconnect=reconnect)
+
+    async def close(self):
+        # 溜まっているDM通知を送り、共有DB接続を閉じてから終了する
+        await dm_notifier.flush_all()
+        await close_all()
+        await super().close()
+
+bot = SpellBot()
+# 起動処理が終わるまでは全コマンドを待たせる (間に合わなければ「起動処理中」と返す)
+bot.add_check(startup.check)
+# 全コマンドの所要時間を計測する
+bot.before_invoke(metrics.before_invoke)
+bot.after_invoke(metrics.after_invoke)
 
 @bot.event
 async def on_ready():
     print(f"{bot.user}はオンラインです。")
 
+@bot.event
+async def on_application_command_error(ctx, error):
+    metrics.record_error('command', ctx.command.qualified_name)
+    # 権限チェックに失敗した場合や起動処理中・初期化失敗の場合は実行者にだけ通知する
+    if isinstance(error, (NotAuthorized, WarmingUp, InitFailed)):
+        await ctx.respond(str(error), ephemeral=True)
+        return
+    print(f"コマンド /{ctx.command.qualified_name} でエラーが発生しました:", file=sys.stderr)
+    traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+
 # このファイル(main.py)からの相対パスでcogsディレクトリを指定
 cogs_dir = os.path.join(os.path.dirname(__file__), 'cogs')
 
@@ -18,7 +54,9 @@ for filename in os.listdir(cogs_dir):
         # srcディレクトリが起点となるため、'cogs.ファイル名'で指定
         bot.load_extension(f'cogs.{filename[:-3]}')
 
-bot.run(os.getenv("TOKEN"))
+# 負荷試験 (benchmarks/bench_e2e.py) では bot を読み込むだけで起動しない
+if __name__ == '__main__':
+    bot.run(os.getenv("TOKEN"))
 
 
 
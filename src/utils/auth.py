@@ -0,0 +1,116 @@
+import asyncio
+import os
+
+import aiosqlite
+from discord.ext import commands
+
+from utils.db import get_pool
+
+# --------------------------------------------------------------------------------
+#  権限チェック
+#  ホワイトリストはメモリ上の集合で保持し、コマンドごとのDBアクセスをなくす
+# --------------------------------------------------------------------------------
+
+
+class NotAuthorized(commands.CheckFailure):
+    def __init__(self):
+        super().__init__("このコマンドを実行する権限がありません。")
+
+
+def _parse_admin_id() -> int:
+    value = os.getenv('ADMIN_ID')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RuntimeError(f"環境変数 ADMIN_ID が設定されていないか、整数ではありません: {value!r}") from None
+
+
+class Authorizer:
+    """管理者判定とホワイトリストを一元管理する。
+
+    管理者のIDは load_admin_id() で環境変数から一度だけ読み込む (WhitelistCog の読み込み時)。
+    ホワイトリストは最初に参照された時点で glossary.db から読み込み、
+    以降は add() / remove() でDBと集合の両方を更新する。
+    """
+
+    def __init__(self):
+        self.db = get_pool('glossary.db')
+        self.whitelist = set()
+        self._admin_id = None
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    def load_admin_id(self) -> int:
+        """環境変数 ADMIN_ID を読み込む。未設定か整数でない場合は RuntimeError。"""
+        self._admin_id = _parse_admin_id()
+        return self._admin_id
+
+    @property
+    def admin_id(self) -> int:
+        if self._admin_id is None:
+            return self.load_admin_id()
+        return self._admin_id
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id == self.admin_id
+
+    async def load(self):
+        async with self._load_lock:
+            async with self.db.write() as db:
+                await db.execute('''
+                    CREATE TABLE IF NOT EXISTS whitelist (
+                        user_id INTEGER PRIMARY KEY
+                    )
+                ''')
+            rows = await self.db.fetchall('SELECT user_id FROM whitelist')
+            self.whitelist = {row[0] for row in rows}
+            self._loaded = True
+
+    async def ensure_loaded(self):
+        if not self._loaded:
+            await self.load()
+
+    async def is_whitelisted(self, user_id: int) -> bool:
+        await self.ensure_loaded()
+        return user_id in self.whitelist
+
+    async def is_privileged(self, user_id: int) -> bool:
+        return self.is_admin(user_id) or await self.is_whitelisted(user_id)
+
+    async def add(self, user_id: int) -> bool:
+        """ホワイトリストに追加する。既に登録されていた場合は False。"""
+        await self.ensure_loaded()
+        try:
+            await self.db.execute('INSERT INTO whitelist (user_id) VALUES (?)', (user_id,))
+        except aiosqlite.IntegrityError:
+            return False
+        self.whitelist.add(user_id)
+        return True
+
+    async def remove(self, user_id: int) -> bool:
+        """ホワイトリストから削除する。登録されていなかった場合は False。"""
+        await self.ensure_loaded()
+        cursor = await self.db.execute('DELETE FROM whitelist WHERE user_id = ?', (user_id,))
+        self.whitelist.discard(user_id)
+        return cursor.rowcount > 0
+
+
+authorizer = Authorizer()
+
+
+def admin_only():
+    """管理者のみ実行できるコマンドにするチェック。"""
+    async def predicate(ctx):
+        if authorizer.is_admin(ctx.author.id):
+            return True
+        raise NotAuthorized()
+    return commands.check(predicate)
+
+
+def whitelist_only():
+    """管理者とホワイトリストのユーザーのみ実行できるコマンドにするチェック。"""
+    async def predicate(ctx):
+        if await authorizer.is_privileged(ctx.author.id):
+            return True
+        raise NotAuthorized()
+    return commands.check(predicate)
@@ -0,0 +1,166 @@
+import asyncio
+
+import numpy as np
+
+from utils.db import get_pool
+from utils.name_index import NgramIndex, PrefixIndex, SuggestionIndex
+from utils.startup import startup
+
+# --------------------------------------------------------------------------------
+#  メモリ上の呪文カタログ
+#  呪文テーブルを起動時に一度だけ読み込み、レベル・クラスを列 (NumPy配列) として保持する
+# --------------------------------------------------------------------------------
+NO_LEVEL = -1
+
+
+def sort_key(level: int, spell_id: int) -> int:
+    """(level, ID) の並び順を保つ1つの整数キー。レベルなし (NO_LEVEL) は先頭に来る。"""
+    return ((level + 1) << 32) | spell_id
+
+CATALOG_FILES = {'spells': 'spells.db', 'Lspells': 'Lspells.db'}
+
+FUZZY_LIMIT = 6 # 候補の数 (番号ボタンの数と同じ)
+AMBIGUITY_MARGIN = 0.1 # 1位との類似度の差がこれ以内の候補があれば、どれか選んでもらう
+
+
+class SpellCatalog:
+    """呪文テーブルの列形式キャッシュ。
+
+    クラス所属 (spell_classes) はクラスごとに1ビットを割り当てたビットマスクで保持し、
+    クラス・レベルでの絞り込みをベクトル演算のマスクで求める。
+    テーブルを変更した後は reload() を呼ぶこと。
+    """
+
+    MAX_CLASSES = 64
+
+    def __init__(self, pool, table: str):
+        self.pool = pool
+        self.table = table
+        self.class_bits = {}
+        self.rows = []
+        self.ids = np.empty(0, dtype=np.int64)
+        self.levels = np.empty(0, dtype=np.int16)
+        self.class_mask = np.empty(0, dtype=np.uint64)
+        self.sort_keys = np.empty(0, dtype=np.int64)
+        self.positions = {}
+        self.names = PrefixIndex()
+        self.fuzzy = NgramIndex()
+        self.suggestions = SuggestionIndex()
+        self.generation = 0 # reload() のたびに増える。描画キャッシュのキーに使う
+        self.loaded = False
+        # 読み込みが重なると、古い内容を読んだ方が後から差し替えてしまうため、1つずつ行う
+        self._reload_lock = asyncio.Lock()
+
+    async def reload(self):
+        async with self._reload_lock:
+            await self._reload()
+
+    async def _reload(self):
+        rows = await self.pool.fetchall(f'SELECT * FROM {self.table} ORDER BY level, ID')
+
+        ids = np.fromiter((row['ID'] for row in rows), dtype=np.int64, count=len(rows))
+        levels = np.fromiter(
+            (NO_LEVEL if row['level'] is None else row['level'] for row in rows),
+            dtype=np.int16, count=len(rows)
+        )
+        positions = {spell_id: index for index, spell_id in enumerate(ids.tolist())}
+        class_mask = np.zeros(len(rows), dtype=np.uint64)
+        class_bits = {}
+        members = await self.pool.fetchall('SELECT spell_id, class_code FROM spell_classes ORDER BY class_code')
+        for spell_id, code in members:
+            index = positions.get(spell_id)
+            if index is None:
+                continue
+            bit = class_bits.get(code)
+            if bit is None:
+                if len(class_bits) >= self.MAX_CLASSES:
+                    continue
+                bit = class_bits[code] = np.uint64(1 << len(class_bits))
+            class_mask[index] |= bit
+
+        # 読み込み途中の状態が見えないよう、全ての列をまとめて差し替える
+        self.rows, self.ids, self.levels, self.positions = rows, ids, levels, positions
+        self.class_bits, self.class_mask = class_bits, class_mask
+        self.sort_keys = ((levels.astype(np.int64) + 1) << 32) | ids
+        self.names.rebuild(row['name'] for row in rows)
+        self.fuzzy.rebuild((row['ID'], row['name']) for row in rows)
+        # 「もしかして」の索引は作り直さず、追加・削除された名前だけ反映する
+        self.suggestions.sync(row['name'] for row in rows)
+        self.generation += 1
+        self.loaded = True
+
+    def get(self, spell_id: int):
+        """IDに対応する呪文の行。存在しない場合は None。"""
+        index = self.positions.get(spell_id)
+        return None if index is None else self.rows[index]
+
+    def _filter_indices(self, class_name: str = None, level: int = None):
+        levels, class_bits, class_mask = self.levels, self.class_bits, self.class_mask
+        mask = np.ones(len(levels), dtype=bool)
+        if class_name:
+            bit = class_bits.get(class_name.upper())
+            if bit is None:
+                return np.empty(0, dtype=np.intp)
+            mask &= (class_mask & bit) != 0
+        if level is not None:
+            mask &= levels == level
+        return np.flatnonzero(mask)
+
+    def filter(self, class_name: str = None, level: int = None):
+        """クラス・レベルで絞り込んだ呪文をレベル順で返す。未知のクラスの場合は空リスト。"""
+        rows = self.rows
+        return [rows[index] for index in self._filter_indices(class_name, level)]
+
+    def page(self, class_name: str = None, level: int = None, after=None, before=None, last: bool = False, limit: int = 6):
+        """絞り込み結果のうち (level, ID) が after より後 / before より前の limit 件と、絞り込み結果の総数を返す。
+
+        last=True の場合は最後のページ、どれも指定しない場合は先頭のページになる。
+        """
+        rows = self.rows
+        indices = self._filter_indices(class_name, level)
+        keys = self.sort_keys[indices]
+        if after is not None:
+            start = int(np.searchsorted(keys, sort_key(*after), side='right'))
+            stop = start + limit
+        elif before is not None:
+            stop = int(np.searchsorted(keys, sort_key(*before), side='left'))
+            start = max(stop - limit, 0)
+        elif last:
+            start = max(len(indices) - 1, 0) // limit * limit
+            stop = start + limit
+        else:
+            start, stop = 0, limit
+        return [rows[index] for index in indices[start:stop]], len(indices)
+
+    def lookup(self, query: str, limit: int = FUZZY_LIMIT, margin: float = AMBIGUITY_MARGIN):
+        """名前があいまいに一致する呪文を (呪文, 候補) で返す。
+
+        1位との類似度の差が margin 以内の候補が他になければ (呪文, [])、
+        あれば (None, 類似度順の候補のリスト)、一致しなければ (None, []) を返す。
+        """
+        matches = self.fuzzy.search(query, limit)
+        if not matches:
+            return None, []
+        best = matches[0][0]
+        close = [self.get(spell_id) for score, spell_id, _ in matches if best - score <= margin]
+        if len(close) == 1:
+            return close[0], []
+        return None, close
+
+
+_catalogs: dict = {}
+
+
+def get_catalog(table: str) -> SpellCatalog:
+    """テーブル名 (spells / Lspells) に対応する共有カタログを返す。"""
+    catalog = _catalogs.get(table)
+    if catalog is None:
+        catalog = _catalogs[table] = SpellCatalog(get_pool(CATALOG_FILES[table]), table)
+    return catalog
+
+
+def spell_name_autocomplete(table: str):
+    """カタログの呪文名を前方一致で返すオートコンプリート関数を作る (SQLiteには問い合わせない)。"""
+    async def autocomplete(ctx):
+        return get_catalog(table).names.search(ctx.value or '')
+    return startup.autocomplete(autocomplete)
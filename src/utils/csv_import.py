@@ -0,0 +1,169 @@
+import asyncio
+import csv
+import hashlib
+import os
+from collections import namedtuple
+
+from utils.spell_classes import replace_spell_classes
+
+# --------------------------------------------------------------------------------
+#  CSV -> SQLite の差分インポート
+#  CSVの解析はワーカースレッドで行い、変更のあった行だけをチャンク単位でexecutemanyする
+# --------------------------------------------------------------------------------
+CHUNK_SIZE = 500
+MAX_REPORTED_IDS = 20 # 取り込めなかった行として表示するIDの数
+
+SyncResult = namedtuple('SyncResult', ['upserted', 'deleted', 'unchanged', 'skipped'])
+
+
+async def _writable_rows(db, table: str, changed, known, adopting: bool, collisions: list):
+    """changed のうち書き込んでよい行を返す。
+
+    CSVの管理外の行 (/spelladd で追加した行など) とIDや名前が重複する行は除き、そのIDを collisions に加える。
+    adopting が真 (初回の同期) の場合、IDと名前がCSVと一致する既存の行はCSVから取り込んだ行として引き継ぐ。
+    """
+    if not changed:
+        return []
+    ids = [data['ID'] for data, _ in changed]
+    names = [data['name'] for data, _ in changed]
+    cursor = await db.execute(f'SELECT ID, name FROM {table} WHERE ID IN ({", ".join("?" * len(ids))})', ids)
+    names_by_id = {row[0]: row[1] for row in await cursor.fetchall()}
+    cursor = await db.execute(f'SELECT name, ID FROM {table} WHERE name IN ({", ".join("?" * len(names))})', names)
+    ids_by_name = {row[0]: row[1] for row in await cursor.fetchall()}
+
+    writable = []
+    claimed = set() # このチャンクで書き込む名前 (CSV内の名前の重複も除く)
+    for data, row_hash in changed:
+        spell_id, name = data['ID'], data['name']
+        if spell_id in known or spell_id not in names_by_id:
+            owned = True
+        else:
+            owned = adopting and names_by_id[spell_id] == name
+        holder = ids_by_name.get(name)
+        if not owned or (holder is not None and holder != spell_id) or name in claimed:
+            collisions.append(spell_id)
+            continue
+        claimed.add(name)
+        writable.append((data, row_hash))
+    return writable
+
+
+def _row_hash(values) -> str:
+    joined = '\x1f'.join('' if value is None else str(value) for value in values)
+    return hashlib.sha1(joined.encode('utf-8')).hexdigest()
+
+
+def _convert_row(row: dict, columns) -> dict:
+    data = {column: row.get(column) for column in columns}
+    if not data['ID']:
+        data['ID'] = None
+    else:
+        data['ID'] = int(data['ID'])
+    if data['level'] and data['level'].isdigit():
+        data['level'] = int(data['level'])
+    else:
+        data['level'] = None
+    return data
+
+
+class _ChunkReader:
+    """CSVを chunk_size 行ずつ読み出す (read_chunk はワーカースレッドから呼ばれる)。"""
+
+    def __init__(self, csv_path: str, columns, chunk_size: int):
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self._file = open(csv_path, 'r', encoding='utf-8-sig')
+        self._reader = csv.DictReader(self._file)
+
+    def read_chunk(self):
+        chunk = []
+        for row in self._reader:
+            data = _convert_row(row, self.columns)
+            if data['ID'] is None or not data['name']:
+                continue # IDや名前のない空行は取り込まない
+            chunk.append((data, _row_hash(data[column] for column in self.columns)))
+            if len(chunk) >= self.chunk_size:
+                break
+        return chunk
+
+    def close(self):
+        self._file.close()
+
+
+async def sync_csv(pool, table: str, csv_path: str, columns, class_codes=(), chunk_size: int = CHUNK_SIZE):
+    """CSVの内容をテーブルへ差分同期する。
+
+    行ごとのハッシュを csv_row_hashes に保存しておき、変更された行だけをUPSERTする。
+    /spelladd で追加した行などCSVの管理外の行には触れず、それとIDや名前が重複するCSVの行は取り込まずに報告する
+    (次回の同期で再び試みる)。初回の同期では、IDと名前がCSVと一致する既存の行をCSVから取り込んだ行として引き継ぐ。
+    CSVから消えた行 (以前CSVから取り込んだもの) は削除する。
+    class_codes を指定した場合、変更された行のクラス列の内容を spell_classes に反映する。
+    CSVが存在しない場合は None を返す。
+    """
+    if not os.path.exists(csv_path):
+        return None
+
+    column_list = ', '.join(columns)
+    placeholders = ', '.join(f':{column}' for column in columns)
+    updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column != 'ID')
+    upsert_sql = f'''
+        INSERT INTO {table} ({column_list}) VALUES ({placeholders})
+        ON CONFLICT(ID) DO UPDATE SET {updates}
+    '''
+
+    reader = await asyncio.to_thread(_ChunkReader, csv_path, columns, chunk_size)
+    upserted = unchanged = deleted = 0
+    collisions = []
+    try:
+        async with pool.write() as db:
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS csv_row_hashes (
+                    ID INTEGER PRIMARY KEY,
+                    row_hash TEXT NOT NULL
+                )
+            ''')
+            cursor = await db.execute('SELECT ID, row_hash FROM csv_row_hashes')
+            known = {row[0]: row[1] for row in await cursor.fetchall()}
+            adopting = not known
+            seen = set()
+
+            while True:
+                chunk = await asyncio.to_thread(reader.read_chunk)
+                if not chunk:
+                    break
+                changed = []
+                for data, row_hash in chunk:
+                    if data['ID'] in seen:
+                        continue # 重複したIDは最初の行を優先する
+                    seen.add(data['ID'])
+                    if known.get(data['ID']) == row_hash:
+                        unchanged += 1
+                    else:
+                        changed.append((data, row_hash))
+                # 書き込む行だけハッシュとクラスを記録する (除いた行は次回また試みる)
+                writable = await _writable_rows(db, table, changed, known, adopting, collisions)
+                if writable:
+                    await db.executemany(upsert_sql, [data for data, _ in writable])
+                    await db.executemany(
+                        'INSERT OR REPLACE INTO csv_row_hashes (ID, row_hash) VALUES (?, ?)',
+                        [(data['ID'], row_hash) for data, row_hash in writable]
+                    )
+                    if class_codes:
+                        await replace_spell_classes(db, [data for data, _ in writable], class_codes)
+                    upserted += len(writable)
+
+            removed = [(spell_id,) for spell_id in known if spell_id not in seen]
+            if removed:
+                await db.executemany(f'DELETE FROM {table} WHERE ID = ?', removed)
+                await db.executemany('DELETE FROM csv_row_hashes WHERE ID = ?', removed)
+                if class_codes:
+                    await db.executemany('DELETE FROM spell_classes WHERE spell_id = ?', removed)
+                deleted = len(removed)
+    finally:
+        reader.close()
+
+    if collisions:
+        shown = ', '.join(str(spell_id) for spell_id in collisions[:MAX_REPORTED_IDS])
+        more = ', ...' if len(collisions) > MAX_REPORTED_IDS else ''
+        print(f"{table}: 既存の呪文とIDか名前が重複するため、CSVの{len(collisions)}行を取り込みませんでした (ID: {shown}{more})。")
+    return SyncResult(upserted, deleted, unchanged, len(collisions))
@@ -0,0 +1,276 @@
+import asyncio
+import os
+import time
+from collections import namedtuple
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+from utils.query_profile import ProfiledConnection, query_profiler
+
+# --------------------------------------------------------------------------------
+#  共有コネクションプール
+#  DBファイルごとに長寿命の接続を保持し、全てのCogで使い回す
+# --------------------------------------------------------------------------------
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+BUSY_TIMEOUT_MS = 5000
+CACHED_STATEMENTS = 256
+READER_COUNT = 2
+
+WRITE_BATCH_MAX = 64
+WRITE_BATCH_WINDOW = 0.002  # 秒。最初の書き込みを受け取ってから後続を待つ最大時間
+
+WriteResult = namedtuple('WriteResult', ['rowcount', 'lastrowid'])
+
+
+class _WriteOp:
+    __slots__ = ('func', 'future')
+
+    def __init__(self, func, future):
+        self.func = func
+        self.future = future
+
+
+class WriteQueue:
+    """DBファイルごとの単一ライター。
+
+    書き込みをasyncioのキューで受け取り、まとめて1トランザクションでコミットする (グループコミット)。
+    各書き込みはSAVEPOINTで区切るため、1件の失敗 (IntegrityErrorなど) は他の書き込みに影響しない。
+    結果や例外は呼び出し元のFutureに返される。
+    """
+
+    def __init__(self, pool, max_batch: int = WRITE_BATCH_MAX, window: float = WRITE_BATCH_WINDOW):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.window = window
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+        self.batches = 0
+        self.writes = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.depth,
+            'batches': self.batches,
+            'writes': self.writes,
+            'last_batch_size': self.last_batch_size,
+            'max_batch_size': self.max_batch_size,
+            'avg_batch_size': self.writes / self.batches if self.batches else 0.0,
+        }
+
+    async def run(self, func):
+        """func(db) をライターのトランザクション内で実行し、その戻り値を返す。"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._worker())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_WriteOp(func, future))
+        return await future
+
+    async def execute(self, sql: str, params=()) -> WriteResult:
+        async def op(db):
+            cursor = await db.execute(sql, params)
+            return WriteResult(cursor.rowcount, cursor.lastrowid)
+        return await self.run(op)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def _worker(self):
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                return
+            # 後続の書き込みが届くのを最大 window 秒だけ待ってからまとめる
+            if self.window and self._queue.empty():
+                await asyncio.sleep(self.window)
+            batch = [first]
+            stopping = False
+            while len(batch) < self.max_batch and not self._queue.empty():
+                op = self._queue.get_nowait()
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+            await self._commit_batch(batch)
+            if stopping:
+                return
+
+    async def _commit_batch(self, batch):
+        results = []
+        async with self.pool._write_lock:
+            db = self.pool._writer
+            profiled = ProfiledConnection(db, self.pool)
+            try:
+                await db.execute('BEGIN')
+                for op in batch:
+                    await db.execute('SAVEPOINT write_op')
+                    try:
+                        result = await op.func(profiled)
+                    except Exception as exc:
+                        await db.execute('ROLLBACK TO write_op')
+                        await db.execute('RELEASE write_op')
+                        results.append((False, exc))
+                    else:
+                        await db.execute('RELEASE write_op')
+                        results.append((True, result))
+                await db.commit()
+            except Exception as exc:
+                await db.rollback()
+                results = [(False, exc)] * len(batch)
+
+        self.batches += 1
+        self.writes += len(batch)
+        self.last_batch_size = len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+
+        for op, (ok, value) in zip(batch, results):
+            if op.future.cancelled():
+                continue
+            if ok:
+                op.future.set_result(value)
+            else:
+                op.future.set_exception(value)
+
+
+class ConnectionPool:
+    """1つのDBファイルに対する接続プール。
+
+    書き込みは1本の接続に集約し、読み込みは複数の接続で並行して行う (WALモード)。
+    接続は最初に使われた時点で開かれる。
+    """
+
+    def __init__(self, path: str, readers: int = READER_COUNT):
+        self.path = path
+        self._reader_count = readers
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+        self._opened = False
+        self.writer = WriteQueue(self)
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened
+
+    async def _connect(self):
+        db = await aiosqlite.connect(self.path, cached_statements=CACHED_STATEMENTS)
+        db.row_factory = aiosqlite.Row
+        await db.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        return db
+
+    async def open(self):
+        if self._opened:
+            return
+        async with self._open_lock:
+            if self._opened:
+                return
+            self._writer = await self._connect()
+            await self._writer.execute('PRAGMA journal_mode = WAL')
+            await self._writer.execute('PRAGMA synchronous = NORMAL')
+            for _ in range(self._reader_count):
+                self._readers.put_nowait(await self._connect())
+            self._opened = True
+
+    async def close(self):
+        if not self._opened:
+            return
+        await self.writer.stop()
+        async with self._write_lock:
+            # 使用中の読み込み接続が返却されるのを待ってから閉じる
+            for _ in range(self._reader_count):
+                reader = await self._readers.get()
+                await reader.close()
+            await self._writer.close()
+            self._writer = None
+            self._opened = False
+
+    @asynccontextmanager
+    async def read(self):
+        """読み込み用の接続を借りる。"""
+        await self.open()
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def write(self):
+        """書き込み用の接続をトランザクションとして借りる (テーブル作成や一括処理向け)。
+
+        ブロックを抜けるとコミットされ、例外が発生した場合はロールバックされる。
+        通常の書き込みは execute() / transaction() でライターのキューを経由させること。
+        """
+        await self.open()
+        async with self._write_lock:
+            try:
+                yield ProfiledConnection(self._writer, self)
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
+
+    async def fetchone(self, sql: str, params=()):
+        async with self.read() as db:
+            started = time.perf_counter()
+            cursor = await db.execute(sql, params)
+            row = await cursor.fetchone()
+        query_profiler.record(self, sql, params, time.perf_counter() - started, 0 if row is None else 1)
+        return row
+
+    async def fetchall(self, sql: str, params=()):
+        async with self.read() as db:
+            started = time.perf_counter()
+            cursor = await db.execute(sql, params)
+            rows = await cursor.fetchall()
+        query_profiler.record(self, sql, params, time.perf_counter() - started, len(rows))
+        return rows
+
+    async def execute(self, sql: str, params=()) -> WriteResult:
+        """1文の書き込みをライターのキューに渡し、コミット後に rowcount / lastrowid を返す。"""
+        await self.open()
+        return await self.writer.execute(sql, params)
+
+    async def transaction(self, func):
+        """複数文の書き込み func(db) をライターのキューに渡し、その戻り値を返す。"""
+        await self.open()
+        return await self.writer.run(func)
+
+
+_pools: dict = {}
+
+
+def get_pool(path: str) -> ConnectionPool:
+    """DBファイルに対応する共有プールを返す (ファイル名のみの場合はdataディレクトリ基準)。"""
+    if not os.path.isabs(path):
+        path = os.path.join(DATA_DIR, path)
+    path = os.path.abspath(path)
+    pool = _pools.get(path)
+    if pool is None:
+        pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+async def close_all():
+    """全てのプールを閉じる (ボット終了時に呼び出す)。"""
+    for pool in list(_pools.values()):
+        await pool.close()
+    _pools.clear()
+
+
+def write_stats() -> dict:
+    """DBファイル名ごとのライターの統計 (キューの深さ・バッチサイズ) を返す。"""
+    return {os.path.basename(path): pool.writer.stats() for path, pool in _pools.items()}
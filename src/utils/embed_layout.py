@@ -0,0 +1,100 @@
+from collections import namedtuple
+
+import discord
+
+# --------------------------------------------------------------------------------
+#  Embedのレイアウト
+#  フィールドをDiscordの上限 (フィールド数・文字数) に収まるよう、できるだけ少ないEmbedに詰める
+# --------------------------------------------------------------------------------
+MAX_FIELDS = 25
+FIELD_NAME_LIMIT = 256
+FIELD_VALUE_LIMIT = 1024
+TITLE_LIMIT = 256
+EMBED_TOTAL_LIMIT = 6000 # 1メッセージに含まれる全Embedの合計でもある
+EMBEDS_PER_MESSAGE = 10
+TITLE_SUFFIX_RESERVE = 12 # 複数に分かれたときに付ける " (1/2)" の分
+EMPTY_FIELD = '\u200b' # 空の値は送れないため、代わりに入れるゼロ幅スペース
+
+Field = namedtuple('Field', ['name', 'value', 'inline'])
+
+
+def split_text(text: str, limit: int = FIELD_VALUE_LIMIT):
+    """text を limit 文字以下の断片に分ける。できるだけ改行の位置で区切る。"""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+
+def split_field(name: str, value: str, inline: bool = False, limit: int = FIELD_VALUE_LIMIT):
+    """値が長いフィールドを複数のフィールドに分ける。2つ目以降の名前には「(続き)」を付ける。"""
+    return [
+        Field(name if index == 0 else f"{name} (続き)", chunk, inline)
+        for index, chunk in enumerate(split_text(value or EMPTY_FIELD, limit))
+    ]
+
+
+def _field_size(field: Field) -> int:
+    return len(field.name) + len(field.value)
+
+
+def pack_fields(fields, title: str, color=None, description: str = None, footer: str = None):
+    """フィールドを上限内に収まるEmbedのリストに詰める。
+
+    順番は保ったまま、各Embedにフィールド数と合計文字数の上限まで詰めていく。
+    description は最初のEmbed、footer は最後のEmbedにだけ付ける。
+    """
+    fields = [
+        part
+        for field in fields
+        for part in split_field(field.name[:FIELD_NAME_LIMIT], field.value, field.inline)
+    ]
+    title = title[:TITLE_LIMIT - TITLE_SUFFIX_RESERVE]
+    footer_size = len(footer) if footer else 0
+
+    pages = [[]]
+    budget = EMBED_TOTAL_LIMIT - TITLE_SUFFIX_RESERVE - len(title) - footer_size - (len(description) if description else 0)
+    for field in fields:
+        size = _field_size(field)
+        if len(pages[-1]) >= MAX_FIELDS or size > budget:
+            pages.append([])
+            budget = EMBED_TOTAL_LIMIT - TITLE_SUFFIX_RESERVE - len(title) - footer_size
+        pages[-1].append(field)
+        budget -= size
+
+    embeds = []
+    for index, page in enumerate(pages):
+        page_title = title if len(pages) == 1 else f"{title} ({index + 1}/{len(pages)})"
+        embed = discord.Embed(title=page_title, color=color, description=description if index == 0 else None)
+        for field in page:
+            embed.add_field(name=field.name, value=field.value, inline=field.inline)
+        if footer and index == len(pages) - 1:
+            embed.set_footer(text=footer)
+        embeds.append(embed)
+    return embeds
+
+
+def pack_messages(embeds):
+    """Embedを1メッセージあたり10件・合計6000文字以内のまとまりに分ける。"""
+    messages = [[]]
+    size = 0
+    for embed in embeds:
+        embed_size = len(embed)
+        if messages[-1] and (len(messages[-1]) >= EMBEDS_PER_MESSAGE or size + embed_size > EMBED_TOTAL_LIMIT):
+            messages.append([])
+            size = 0
+        messages[-1].append(embed)
+        size += embed_size
+    return messages if messages[0] else []
+
+
+async def send_embeds(send, embeds, **kwargs):
+    """send (ctx.respond や user.send など) を、必要な最小限のメッセージ数だけ呼んでEmbedを全て送る。"""
+    for group in pack_messages(embeds):
+        await send(embeds=group, **kwargs)
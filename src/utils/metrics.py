@@ -0,0 +1,145 @@
+import asyncio
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from utils.db import DATA_DIR
+
+# --------------------------------------------------------------------------------
+#  コマンド・コンポーネントの計測
+#  所要時間は対数目盛りのバケットに数えるだけなので、呼び出し回数が増えてもメモリは一定
+# --------------------------------------------------------------------------------
+BUCKET_BASE = 0.0001 # 秒。最初のバケットの上限 (0.1ms)
+BUCKET_GROWTH = 1.15 # バケットの幅の増加率 (パーセンタイルの誤差は最大15%)
+BUCKET_COUNT = 110 # 0.1ms 〜 約8分
+MAX_SERIES = 256 # 計測対象の名前の上限。超えた分は OTHER にまとめる
+OTHER = '(その他)'
+
+SNAPSHOT_PATH = os.path.join(DATA_DIR, 'metrics_snapshot.json')
+SNAPSHOT_INTERVAL = 60 # 秒
+
+
+def _bucket_bounds():
+    return [BUCKET_BASE * BUCKET_GROWTH ** index for index in range(BUCKET_COUNT)]
+
+
+class LatencyHistogram:
+    """所要時間の分布・回数・エラー数を保持する。パーセンタイルはバケットの上限値で近似する。"""
+
+    BOUNDS = _bucket_bounds()
+
+    def __init__(self):
+        self.buckets = [0] * (BUCKET_COUNT + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        if seconds <= BUCKET_BASE:
+            index = 0
+        else:
+            index = min(math.ceil(math.log(seconds / BUCKET_BASE, BUCKET_GROWTH)), BUCKET_COUNT)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                return min(self.BOUNDS[index] if index < BUCKET_COUNT else self.max, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(0.50) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+def _write_json(path: str, data: dict):
+    # 書き込み途中のファイルが読まれないよう、一時ファイルに書いてから置き換える
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as snapshot_file:
+        json.dump(data, snapshot_file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+class Metrics:
+    """種類 (command / component) と名前ごとの LatencyHistogram を管理する。"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._series = {}
+
+    def _histogram(self, kind: str, name: str) -> LatencyHistogram:
+        series = self._series.setdefault(kind, {})
+        histogram = series.get(name)
+        if histogram is None:
+            if len(series) >= MAX_SERIES:
+                name = OTHER
+            histogram = series.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def record(self, kind: str, name: str, seconds: float):
+        self._histogram(kind, name).record(seconds)
+
+    def record_error(self, kind: str, name: str):
+        self._histogram(kind, name).errors += 1
+
+    @contextmanager
+    def measure(self, kind: str, name: str):
+        """with ブロックの所要時間を記録する。例外が出た場合はエラーとしても数える。"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record_error(kind, name)
+            raise
+        finally:
+            self.record(kind, name, time.perf_counter() - started)
+
+    # ---- スラッシュコマンドの前後フック (main.py で登録する) ----
+    async def before_invoke(self, ctx):
+        ctx.metrics_started_at = time.perf_counter()
+
+    async def after_invoke(self, ctx):
+        started = getattr(ctx, 'metrics_started_at', None)
+        if started is not None:
+            self.record('command', ctx.command.qualified_name, time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        return {
+            'written_at': datetime.now(timezone.utc).isoformat(),
+            'uptime_seconds': time.time() - self.started_at,
+            **{
+                kind: {name: histogram.summary() for name, histogram in sorted(series.items())}
+                for kind, series in self._series.items()
+            },
+        }
+
+    async def write_snapshots(self, interval: float = SNAPSHOT_INTERVAL, path: str = SNAPSHOT_PATH):
+        """interval 秒ごとにスナップショットを書き出し続ける。集計はイベントループ上で行い、書き込みだけ別スレッドで行う。"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(_write_json, path, self.snapshot())
+            except OSError as exc:
+                print(f"計測値のスナップショットを書き出せませんでした: {exc}")
+
+
+metrics = Metrics()
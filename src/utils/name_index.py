@@ -0,0 +1,260 @@
+import bisect
+import heapq
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+# --------------------------------------------------------------------------------
+#  名前の索引 (オートコンプリート用の前方一致・部分一致、n-gramによるあいまい検索、編集距離による「もしかして」)
+# --------------------------------------------------------------------------------
+MAX_CHOICES = 25 # Discordのオートコンプリート候補の上限
+
+NGRAM_SIZE = 3
+MIN_SIMILARITY = 0.15 # これより似ていない名前は候補にしない
+EXACT_BONUS = 1.0
+PREFIX_BONUS = 0.3
+SUBSTRING_BONUS = 0.15
+SUGGEST_DISTANCE = 2 # 「もしかして」に出す名前の最大の編集距離
+SUGGEST_PREFIX_LENGTH = 7 # 削除による近傍は名前の先頭この文字数だけから作る (索引の大きさを抑える)
+MAX_SUGGESTIONS = 5
+# 表記揺れの多い区切り記号・長音は類似度の計算では無視する
+_FUZZY_IGNORED = re.compile(r'[\s・ー\-_/()]')
+
+# カタカナ (ァ〜ヶ, ヽヾ) をひらがなに寄せる変換表
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+_KATAKANA_TO_HIRAGANA.update({ord('ヽ'): ord('ゝ'), ord('ヾ'): ord('ゞ')})
+
+
+def normalize_key(text: str) -> str:
+    """全角・半角、大文字・小文字、ひらがな・カタカナの違いを吸収した比較用のキーを返す。"""
+    return unicodedata.normalize('NFKC', text).casefold().translate(_KATAKANA_TO_HIRAGANA)
+
+
+class PrefixIndex:
+    """正規化した名前のソート済みリスト。
+
+    search() は二分探索による前方一致、match() は前方一致と部分一致を順位付けして返す。
+    """
+
+    def __init__(self, names=()):
+        self._entries = []
+        self.rebuild(names)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def rebuild(self, names):
+        self._entries = sorted({(normalize_key(name), name) for name in names if name})
+
+    def add(self, name: str):
+        entry = (normalize_key(name), name)
+        index = bisect.bisect_left(self._entries, entry)
+        if index == len(self._entries) or self._entries[index] != entry:
+            self._entries.insert(index, entry)
+
+    def remove(self, name: str):
+        entry = (normalize_key(name), name)
+        index = bisect.bisect_left(self._entries, entry)
+        if index < len(self._entries) and self._entries[index] == entry:
+            del self._entries[index]
+
+    def search(self, prefix: str, limit: int = MAX_CHOICES):
+        key = normalize_key(prefix)
+        entries = self._entries
+        results = []
+        for index in range(bisect.bisect_left(entries, (key,)), len(entries)):
+            entry_key, name = entries[index]
+            if not entry_key.startswith(key) or len(results) >= limit:
+                break
+            results.append(name)
+        return results
+
+    def match(self, query: str, limit: int = MAX_CHOICES):
+        """完全一致 → 前方一致 → 部分一致の順に、一致位置が前で短い名前ほど上位にして返す。"""
+        key = normalize_key(query)
+        if not key:
+            return [name for _, name in self._entries[:limit]]
+        ranked = []
+        for entry_key, name in self._entries:
+            position = entry_key.find(key)
+            if position >= 0:
+                ranked.append((entry_key != key, position != 0, position, len(entry_key), entry_key, name))
+        return [item[-1] for item in heapq.nsmallest(limit, ranked)]
+
+
+def fuzzy_key(text: str) -> str:
+    """normalize_key() からさらに区切り記号と長音を取り除いた、あいまい検索用のキーを返す。"""
+    return _FUZZY_IGNORED.sub('', normalize_key(text))
+
+
+def ngrams(key: str, n: int = NGRAM_SIZE):
+    """先頭に2文字・末尾に1文字の境界記号を付けた n-gram の集合を返す (1文字の名前にもn-gramができる)。"""
+    padded = f'\x02\x02{key}\x03'
+    return {padded[index:index + n] for index in range(len(padded) - n + 1)}
+
+
+class NgramIndex:
+    """名前の n-gram (trigram) の転置索引。
+
+    search() は問い合わせと n-gram を共有する名前だけを数え上げ、Jaccard係数に
+    完全一致・前方一致・部分一致の加点をした類似度の高い順に返す。
+    """
+
+    def __init__(self, items=()):
+        self._keys = {}
+        self._postings = {}
+        self.rebuild(items)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def rebuild(self, items):
+        """(ID, 名前) の組から索引を作り直す。"""
+        keys = {}
+        postings = defaultdict(list)
+        for item_id, name in items:
+            if not name:
+                continue
+            key = fuzzy_key(name)
+            grams = ngrams(key)
+            keys[item_id] = (key, name, len(grams))
+            for gram in grams:
+                postings[gram].append(item_id)
+        self._keys, self._postings = keys, dict(postings)
+
+    def search(self, query: str, limit: int = MAX_CHOICES, min_similarity: float = MIN_SIMILARITY):
+        """(類似度, ID, 名前) を類似度の高い順に返す。同じ類似度なら短い名前を上位にする。"""
+        key = fuzzy_key(query)
+        if not key:
+            return []
+        grams = ngrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+
+        ranked = []
+        for item_id, count in shared.items():
+            item_key, name, size = self._keys[item_id]
+            score = count / (len(grams) + size - count)
+            if item_key == key:
+                score += EXACT_BONUS
+            elif item_key.startswith(key):
+                score += PREFIX_BONUS
+            elif key in item_key:
+                score += SUBSTRING_BONUS
+            if score >= min_similarity:
+                ranked.append((score, item_id, name))
+        return heapq.nlargest(limit, ranked, key=lambda item: (item[0], -len(item[2])))
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """a と b の編集距離 (隣接する2文字の入れ替えも1回と数える)。limit を超える場合は limit + 1 を返す。"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if before_previous is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before_previous[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def _deletes(key: str, distance: int, prefix_length: int):
+    """key の先頭 prefix_length 文字から distance 文字以内を削除してできる文字列の集合 (削除なしを含む)。"""
+    found = {key[:prefix_length]}
+    frontier = found
+    for _ in range(distance):
+        frontier = {word[:index] + word[index + 1:] for word in frontier for index in range(len(word))} - found
+        found |= frontier
+    return found
+
+
+class SuggestionIndex:
+    """編集距離の近い名前を探す索引 (SymSpell方式)。
+
+    名前ごとに「何文字か削除した文字列」を登録しておき、問い合わせからも同じように削除した文字列を作って
+    共通するものを候補にする。候補だけ実際の編集距離を計算するので、全件と比較せずに済む。
+    add() / remove() で1件ずつ更新できる。
+    """
+
+    def __init__(self, names=(), max_distance: int = SUGGEST_DISTANCE, prefix_length: int = SUGGEST_PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._names = {}
+        self._deletes = defaultdict(set)
+        self.rebuild(names)
+
+    def __len__(self):
+        return sum(len(names) for names in self._names.values())
+
+    def rebuild(self, names):
+        self._names = {}
+        self._deletes = defaultdict(set)
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str):
+        key = fuzzy_key(name) if name else ''
+        if not key:
+            return
+        names = self._names.get(key)
+        if names is None:
+            names = self._names[key] = set()
+            for variant in _deletes(key, self.max_distance, self.prefix_length):
+                self._deletes[variant].add(key)
+        names.add(name)
+
+    def remove(self, name: str):
+        key = fuzzy_key(name) if name else ''
+        names = self._names.get(key)
+        if not names or name not in names:
+            return
+        names.discard(name)
+        if names:
+            return
+        del self._names[key]
+        for variant in _deletes(key, self.max_distance, self.prefix_length):
+            keys = self._deletes.get(variant)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._deletes[variant]
+
+    def sync(self, names):
+        """names と同じ内容になるよう、増えた名前と消えた名前だけを追加・削除する。"""
+        names = {name for name in names if name}
+        current = {name for key_names in self._names.values() for name in key_names}
+        for name in current - names:
+            self.remove(name)
+        for name in names - current:
+            self.add(name)
+
+    def suggest(self, query: str, limit: int = MAX_SUGGESTIONS):
+        """query に編集距離の近い名前を、距離が近く長さの差が小さい順に返す。
+
+        短い問い合わせで無関係な名前ばかり出ないよう、許す距離は3文字につき1 (最大 max_distance) にする。
+        """
+        key = fuzzy_key(query)
+        if not key:
+            return []
+        distance = min(self.max_distance, max(1, len(key) // 3))
+        candidates = set()
+        for variant in _deletes(key, distance, self.prefix_length):
+            candidates.update(self._deletes.get(variant, ()))
+
+        ranked = []
+        for candidate in candidates:
+            candidate_distance = edit_distance(key, candidate, distance)
+            if candidate_distance <= distance:
+                ranked.extend(
+                    (candidate_distance, abs(len(candidate) - len(key)), name)
+                    for name in self._names[candidate]
+                )
+        return [name for _, _, name in heapq.nsmallest(limit, ranked)]
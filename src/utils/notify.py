@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import discord
+
+# --------------------------------------------------------------------------------
+#  DM通知のまとめ送り
+#  短時間に続いた呪文セットの変更をユーザーごとに1通のDMにまとめ、DMのレート制限に掛からないようにする
+# --------------------------------------------------------------------------------
+NOTIFY_WINDOW = 2.0 # 秒。最後の変更からこの時間、次の変更がなければ送信する
+NOTIFY_MAX_DELAY = 10.0 # 秒。変更が続いても最初の変更からこの時間が経てば送信する
+DEDUPE_WINDOW = 0.75 # 秒。同じ呪文への操作がこの間隔より短ければ二重押しとして無視する
+
+
+class _Pending:
+    __slots__ = ('user', 'lines', 'first_at', 'task')
+
+    def __init__(self, user):
+        self.user = user
+        self.lines = {}
+        self.first_at = time.monotonic()
+        self.task = None
+
+
+class NotificationBuffer:
+    """ユーザーごとの通知をデバウンスしてまとめて送る。
+
+    push() に渡した key が同じ通知は後のもので置き換える (追加してすぐ削除した場合は最後の状態だけを伝える)。
+    """
+
+    def __init__(self, window: float = NOTIFY_WINDOW, max_delay: float = NOTIFY_MAX_DELAY, dedupe_window: float = DEDUPE_WINDOW):
+        self.window = window
+        self.max_delay = max_delay
+        self.dedupe_window = dedupe_window
+        self._pending = {}
+        self._recent = {}
+        self._timers = set() # まとめ送りのタイマー (送信中のものを含む)
+        self.pushed = 0
+        self.coalesced = 0 # 他の通知と同じDMにまとめた、または後の通知で置き換えた件数
+        self.sent = 0
+        self.deduped = 0
+        self.failed = 0
+
+    def is_duplicate(self, user_id: int, key) -> bool:
+        """同じユーザーが同じ対象を直前に操作していれば True (DBに触れる前の二重押し判定)。"""
+        now = time.monotonic()
+        recent_key = (user_id, key)
+        last = self._recent.get(recent_key)
+        self._recent[recent_key] = now
+        if len(self._recent) > 4096:
+            self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedupe_window}
+        if last is not None and now - last < self.dedupe_window:
+            self.deduped += 1
+            return True
+        return False
+
+    def push(self, user, key, line: str):
+        """通知を溜め、まとめ送りのタイマーを掛け直す。"""
+        pending = self._pending.get(user.id)
+        if pending is None:
+            pending = self._pending[user.id] = _Pending(user)
+        elif pending.task is not None:
+            pending.task.cancel()
+        self.pushed += 1
+        if key in pending.lines:
+            self.coalesced += 1
+        pending.lines[key] = line
+
+        delay = min(self.window, max(pending.first_at + self.max_delay - time.monotonic(), 0))
+        pending.task = asyncio.create_task(self._flush_later(user.id, delay))
+        self._timers.add(pending.task)
+        pending.task.add_done_callback(self._timers.discard)
+
+    async def _flush_later(self, user_id: int, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush(user_id)
+
+    async def flush(self, user_id: int):
+        pending = self._pending.pop(user_id, None)
+        if pending is None or not pending.lines:
+            return
+        lines = list(pending.lines.values())
+        self.coalesced += len(lines) - 1
+        text = lines[0] if len(lines) == 1 else "呪文セットを更新しました。\n" + "\n".join(f"・{line}" for line in lines)
+        try:
+            await pending.user.send(text)
+            self.sent += 1
+        except discord.HTTPException as exc:
+            # DMを受け付けていないユーザーなど
+            self.failed += 1
+            print(f"DMを送信できませんでした (ユーザーID: {user_id}): {exc}")
+
+    async def flush_all(self):
+        """溜まっている通知を全て送る (終了時用)。"""
+        # 待機中のタイマーは送信の前にまとめて止める
+        # (1件ずつ送る間に起きて送信を始めたタイマーを止めると、そのDMが途中で失われる)
+        user_ids = list(self._pending)
+        for user_id in user_ids:
+            task = self._pending[user_id].task
+            if task is not None:
+                task.cancel()
+        for user_id in user_ids:
+            await self.flush(user_id)
+        # 既に送信を始めていたタイマーも、送り終えるまで待つ
+        if self._timers:
+            await asyncio.gather(*self._timers, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'pushed': self.pushed,
+            'coalesced': self.coalesced,
+            'sent': self.sent,
+            'deduped': self.deduped,
+            'failed': self.failed,
+            'pending_users': len(self._pending),
+        }
+
+
+dm_notifier = NotificationBuffer()
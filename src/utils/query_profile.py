@@ -0,0 +1,162 @@
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+
+# --------------------------------------------------------------------------------
+#  SQLの計測
+#  ConnectionPool を通る文を形 (リテラルと空白を正規化したSQL) ごとに集計し、
+#  閾値を超えた文は EXPLAIN QUERY PLAN の結果と一緒に遅いクエリのログに残す
+# --------------------------------------------------------------------------------
+SLOW_QUERY_SECONDS = float(os.getenv('SLOW_QUERY_MS', '100')) / 1000
+SLOW_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'slow_queries.log')
+SLOW_LOG_SIZE = 100 # メモリ上に残す遅いクエリの件数
+MAX_SHAPES = 512
+OTHER_SHAPE = '(その他)'
+
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+# FTS5 の MATCH による検索 (例: "SCAN f VIRTUAL TABLE INDEX 0:M1") は全件走査ではない
+_FTS_MATCH = re.compile(r'VIRTUAL TABLE INDEX \d+:M')
+
+
+@lru_cache(maxsize=1024)
+def query_shape(sql: str) -> str:
+    """SQLからリテラル・空白・IN句のプレースホルダー数の違いを取り除いた形を返す。"""
+    shape = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    shape = re.sub(r'\b\d+\b', '?', shape)
+    shape = re.sub(r'\s+', ' ', shape).strip()
+    shape = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?, ...)', shape)
+    return shape
+
+
+class QueryStats:
+    __slots__ = ('count', 'total', 'max', 'rows', 'plan')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.plan = None
+
+    @property
+    def full_scan(self) -> bool:
+        """クエリプランに全件走査が含まれるか。
+
+        SEARCH はインデックスでの検索、SCAN はテーブルかインデックス全体の走査
+        (USING COVERING INDEX でも全体を読む)。FTS5 の MATCH だけは SCAN と表示されても除く。
+        """
+        return bool(self.plan) and any(
+            detail.startswith('SCAN') and not _FTS_MATCH.search(detail) for detail in self.plan
+        )
+
+
+class QueryProfiler:
+    """(DBファイル, SQLの形) ごとの実行回数・所要時間・行数と、遅いクエリの記録。"""
+
+    def __init__(self, threshold: float = SLOW_QUERY_SECONDS, log_path: str = SLOW_LOG_PATH):
+        self.threshold = threshold
+        self.log_path = log_path
+        self.shapes = {}
+        self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+        self.slow_count = 0
+        self._tasks = set()
+
+    def record(self, pool, sql: str, params, elapsed: float, rows: int):
+        key = (os.path.basename(pool.path), query_shape(sql))
+        stats = self.shapes.get(key)
+        if stats is None:
+            if len(self.shapes) >= MAX_SHAPES:
+                key = (key[0], OTHER_SHAPE)
+            stats = self.shapes.setdefault(key, QueryStats())
+            # 遅くなる前に全件走査に気付けるよう、プランは形ごとに最初に見たときに取得する
+            if stats.count == 0 and key[1] != OTHER_SHAPE:
+                self._spawn(self._capture_plan(pool, stats, sql, params))
+        stats.count += 1
+        stats.total += elapsed
+        stats.max = max(stats.max, elapsed)
+        stats.rows += max(rows, 0)
+
+        if elapsed >= self.threshold:
+            self.slow_count += 1
+            self._spawn(self._log_slow(pool, key, stats, sql, params, elapsed, rows))
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, pool, sql: str, params):
+        # 閉じたプールを開き直さないよう、終了処理の後には実行しない
+        if not pool.is_open or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            async with pool.read() as db:
+                cursor = await db.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                return [row[3] for row in await cursor.fetchall()]
+        except Exception as exc:
+            return [f'(EXPLAIN に失敗しました: {exc})']
+
+    async def _capture_plan(self, pool, stats, sql: str, params):
+        plan = await self._explain(pool, sql, params)
+        if stats.plan is None:
+            stats.plan = plan
+
+    async def _log_slow(self, pool, key, stats, sql: str, params, elapsed: float, rows: int):
+        # 最初に見たときのプラン取得がまだ終わっていなければ、ここで取得する
+        if stats.plan is None:
+            stats.plan = await self._explain(pool, sql, params)
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'db': key[0],
+            'sql': key[1],
+            'elapsed_ms': elapsed * 1000,
+            'rows': rows,
+            'plan': stats.plan,
+        }
+        self.slow_queries.append(entry)
+        try:
+            await asyncio.to_thread(self._append_log, entry)
+        except OSError as exc:
+            print(f"遅いクエリのログを書き込めませんでした: {exc}")
+
+    def _append_log(self, entry: dict):
+        with open(self.log_path, 'a', encoding='utf-8') as log_file:
+            log_file.write(f"{entry['at']} [{entry['db']}] {entry['elapsed_ms']:.1f}ms rows={entry['rows']} {entry['sql']}\n")
+            for detail in entry['plan']:
+                log_file.write(f"    {detail}\n")
+
+    def top(self, limit: int = 15):
+        """合計所要時間の長い順に ((DBファイル, SQLの形), QueryStats) を返す。"""
+        return sorted(self.shapes.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+
+
+query_profiler = QueryProfiler()
+
+
+class ProfiledConnection:
+    """aiosqlite の接続を包み、execute / executemany を計測する (それ以外はそのまま委譲する)。"""
+
+    def __init__(self, db, pool):
+        self._db = db
+        self._pool = pool
+
+    async def execute(self, sql: str, params=()):
+        started = time.perf_counter()
+        cursor = await self._db.execute(sql, params)
+        query_profiler.record(self._pool, sql, params, time.perf_counter() - started, cursor.rowcount)
+        return cursor
+
+    async def executemany(self, sql: str, params_seq):
+        started = time.perf_counter()
+        cursor = await self._db.executemany(sql, params_seq)
+        # プランの取得 (EXPLAIN) には最初の行のパラメーターを使う
+        first = params_seq[0] if isinstance(params_seq, (list, tuple)) and params_seq else ()
+        query_profiler.record(self._pool, sql, first, time.perf_counter() - started, cursor.rowcount)
+        return cursor
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+# --------------------------------------------------------------------------------
+#  Embedの描画結果キャッシュ
+#  キーに呪文カタログの世代番号を含めるため、カタログが更新されると古いエントリは参照されなくなる
+# --------------------------------------------------------------------------------
+RENDER_CACHE_SIZE = 512
+
+
+class RenderCache:
+    """(カタログ, キー, 世代) ごとに描画済みのEmbedを保持するLRUキャッシュ。
+
+    キャッシュしたEmbedは複数の応答で共有されるため、取り出した側で変更しないこと。
+    """
+
+    def __init__(self, maxsize: int = RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, catalog, key):
+        """カタログの現在の世代を含めたキャッシュキーを作る (描画前に取得しておくこと)。"""
+        return (catalog.table, key, catalog.generation)
+
+    def get(self, cache_key):
+        value = self._entries.get(cache_key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(cache_key)
+        self.hits += 1
+        return value
+
+    def put(self, cache_key, value):
+        self._entries[cache_key] = value
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+render_cache = RenderCache()
@@ -0,0 +1,37 @@
+# --------------------------------------------------------------------------------
+#  呪文とクラスの対応表 (spell_classes)
+#  旧来の WIZ〜REN などの Y/空欄 列の代わりに、(spell_id, class_code) の行で所属を表す
+# --------------------------------------------------------------------------------
+SCHEMA_VERSION = 1
+
+
+async def setup_spell_classes(db, table: str, class_codes):
+    """spell_classes テーブルと索引を作成し、旧来のクラス列から一度だけ移行する。"""
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS spell_classes (
+            spell_id INTEGER NOT NULL,
+            class_code TEXT NOT NULL,
+            PRIMARY KEY (spell_id, class_code)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_spell_classes_class ON spell_classes (class_code, spell_id)')
+    await db.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_level ON {table} (level, ID)')
+
+    cursor = await db.execute('PRAGMA user_version')
+    version = (await cursor.fetchone())[0]
+    if version < SCHEMA_VERSION:
+        for code in class_codes:
+            await db.execute(
+                f"INSERT OR IGNORE INTO spell_classes (spell_id, class_code) SELECT ID, ? FROM {table} WHERE {code} = 'Y'",
+                (code,)
+            )
+        await db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+async def replace_spell_classes(db, rows, class_codes):
+    """CSVの行 (dict) のクラス列の内容で spell_classes を置き換える。"""
+    await db.executemany('DELETE FROM spell_classes WHERE spell_id = ?', [(row['ID'],) for row in rows])
+    await db.executemany(
+        'INSERT OR IGNORE INTO spell_classes (spell_id, class_code) VALUES (?, ?)',
+        [(row['ID'], code) for row in rows for code in class_codes if row.get(code) == 'Y']
+    )
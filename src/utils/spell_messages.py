@@ -0,0 +1,112 @@
+from collections import OrderedDict, namedtuple
+
+import discord
+
+# --------------------------------------------------------------------------------
+#  呪文一覧メッセージの索引
+#  メッセージIDから「どのテーブルのどの呪文が表示されているか」を引けるようにし、
+#  キャッシュにないメッセージへのリアクションでもフッターを取得し直さずに済ませる
+# --------------------------------------------------------------------------------
+MESSAGE_INDEX_SIZE = 2048
+
+# フッターの接頭辞と呪文テーブルの対応 (例: "spell_ids:1,2,3")
+FOOTER_TABLES = {'spell_ids': 'spells', 'Lspell_ids': 'Lspells'}
+
+SpellMessage = namedtuple('SpellMessage', ['table', 'spell_ids'])
+
+# 呪文セットの追加・削除ボタン
+# 一覧の番号ボタンは追加・削除を切り替える (custom_id: "spellset:<テーブル>:<呪文ID>")
+# /setspell・/unsetspell の候補ボタンはその操作だけを行う (custom_id: "spellset:<add|remove>:<テーブル>:<呪文ID>")
+SPELL_SET_PREFIX = 'spellset'
+SPELL_SET_TOGGLE = 'toggle'
+SPELL_SET_ACTIONS = ('add', 'remove')
+NUMBER_EMOJIS = ("1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣")
+
+
+def parse_footer(text: str):
+    """一覧Embedのフッターから SpellMessage を作る。形式が違う場合は None。"""
+    if not text:
+        return None
+    prefix, _, ids = text.partition(':')
+    table = FOOTER_TABLES.get(prefix)
+    if table is None:
+        return None
+    try:
+        return SpellMessage(table, tuple(int(spell_id) for spell_id in ids.split(',')))
+    except ValueError:
+        return None
+
+
+def add_spell_set_buttons(view: discord.ui.View, table: str, spell_ids, row: int = 1, action: str = SPELL_SET_TOGGLE):
+    """ページに表示した順に番号ボタンを追加する (1行に3つ)。押下は SpellReactionHandlerCog がcustom_idから処理する。"""
+    prefix = SPELL_SET_PREFIX if action == SPELL_SET_TOGGLE else f'{SPELL_SET_PREFIX}:{action}'
+    for index, (emoji, spell_id) in enumerate(zip(NUMBER_EMOJIS, spell_ids)):
+        view.add_item(discord.ui.Button(
+            emoji=emoji, style=discord.ButtonStyle.secondary, row=row + index // 3,
+            custom_id=f'{prefix}:{table}:{spell_id}'
+        ))
+    return view
+
+
+def parse_spell_set_custom_id(custom_id: str):
+    """番号ボタンのcustom_idから (操作, テーブル, 呪文ID) を返す。形式が違う場合は None。"""
+    parts = custom_id.split(':')
+    if not parts or parts[0] != SPELL_SET_PREFIX:
+        return None
+    if len(parts) == 3:
+        action = SPELL_SET_TOGGLE
+    elif len(parts) == 4 and parts[1] in SPELL_SET_ACTIONS:
+        action = parts.pop(1)
+    else:
+        return None
+    if parts[1] not in FOOTER_TABLES.values():
+        return None
+    try:
+        return action, parts[1], int(parts[2])
+    except ValueError:
+        return None
+
+
+def spell_choice_prompt(table: str, query: str, spells, action: str):
+    """名前が紛らわしい呪文の候補一覧と番号ボタンを返す。ボタンを押すとその呪文に action ('add' / 'remove') を行う。"""
+    lines = [
+        f"{emoji} {spell['name']} (ID: {spell['ID']} / レベル: {spell['level'] if spell['level'] is not None else '(なし)'})"
+        for emoji, spell in zip(NUMBER_EMOJIS, spells)
+    ]
+    guide = "呪文セットに追加します" if action == 'add' else "呪文セットから削除します"
+    embed = discord.Embed(
+        title=f"'{query}' に近い呪文が複数あります",
+        description="\n".join(lines) + f"\n\n番号ボタンで選んだ呪文を{guide}。",
+        color=discord.Color.orange()
+    )
+    view = add_spell_set_buttons(
+        discord.ui.View(timeout=None), table, [spell['ID'] for spell in spells], row=0, action=action
+    )
+    view.stop() # 押下は custom_id から処理するので、ボット側に保持しない
+    return embed, view
+
+
+class SpellMessageIndex:
+    """メッセージIDごとの SpellMessage を保持するLRU。ページが差し替わるたびに remember() で上書きする。"""
+
+    def __init__(self, maxsize: int = MESSAGE_INDEX_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def remember(self, message_id: int, table: str, spell_ids):
+        self._entries[message_id] = SpellMessage(table, tuple(spell_ids))
+        self._entries.move_to_end(message_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, message_id: int):
+        entry = self._entries.get(message_id)
+        if entry is not None:
+            self._entries.move_to_end(message_id)
+        return entry
+
+
+spell_messages = SpellMessageIndex()
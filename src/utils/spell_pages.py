@@ -0,0 +1,203 @@
+import asyncio
+from collections import namedtuple
+
+import discord
+
+from utils.catalog import NO_LEVEL
+from utils.metrics import metrics
+from utils.render_cache import render_cache
+from utils.spell_messages import add_spell_set_buttons, spell_messages
+from utils.startup import startup
+
+# --------------------------------------------------------------------------------
+#  呪文一覧のページ送り
+#  ページの状態 (絞り込み条件とキーセットのカーソル) はボタンのcustom_idだけに持たせ、
+#  メッセージごとのPythonオブジェクトを残さない。再起動後に押されたボタンにも応答できる
+# --------------------------------------------------------------------------------
+PAGE_SIZE = 6
+CUSTOM_ID_PREFIX = 'spellpage'
+
+# direction: f=先頭, n=カーソルより後, p=カーソルより前, l=最後
+PageRequest = namedtuple('PageRequest', ['class_code', 'level', 'direction', 'page', 'cursor'])
+RenderedPage = namedtuple('RenderedPage', ['class_code', 'level', 'embed', 'spell_ids', 'page', 'page_count', 'first', 'last'])
+
+
+def _level_of(spell) -> int:
+    return NO_LEVEL if spell['level'] is None else spell['level']
+
+
+class SpellPager:
+    """呪文テーブル1つ分の一覧を、要求されたページだけ (level, ID) のキーセットで取得して描画する。
+
+    render(spells, page_index, page_count) はページのEmbedを作る関数。
+    ボタンの押下は Cog の on_interaction から handle() に渡す。
+    """
+
+    def __init__(self, table: str, catalog, pool, render, cog_name: str = None):
+        self.table = table
+        self.cog_name = cog_name # ボタンを受け付けるのはこのCogの初期化が終わってから
+        self.catalog = catalog
+        self.pool = pool
+        self.render = render
+        self._prefetching = {}
+
+    # ---- custom_id ----
+    def _custom_id(self, class_code, level, direction, page, cursor=None):
+        cursor_level, cursor_id = cursor if cursor is not None else ('', '')
+        return ':'.join(str(part) for part in (
+            CUSTOM_ID_PREFIX, self.table, class_code or '', '' if level is None else level,
+            direction, page, cursor_level, cursor_id
+        ))
+
+    def parse(self, custom_id: str):
+        """このテーブルのページ送りボタンであれば PageRequest を返す。"""
+        parts = custom_id.split(':')
+        if len(parts) != 8 or parts[0] != CUSTOM_ID_PREFIX or parts[1] != self.table:
+            return None
+        _, _, class_code, level, direction, page, cursor_level, cursor_id = parts
+        if direction not in ('f', 'n', 'p', 'l'):
+            return None
+        try:
+            cursor = (int(cursor_level), int(cursor_id)) if direction in ('n', 'p') else None
+            return PageRequest(class_code or None, int(level) if level else None, direction, int(page), cursor)
+        except ValueError:
+            return None
+
+    # ---- 取得 ----
+    async def _fetch(self, request: PageRequest):
+        """ページの呪文と絞り込み結果の総数を返す。"""
+        if self.catalog.loaded:
+            return self.catalog.page(
+                request.class_code, request.level,
+                after=request.cursor if request.direction == 'n' else None,
+                before=request.cursor if request.direction == 'p' else None,
+                last=request.direction == 'l',
+                limit=PAGE_SIZE
+            )
+        return await self._fetch_sql(request)
+
+    async def _fetch_sql(self, request: PageRequest):
+        # カタログの読み込み前は (COALESCE(level, -1), ID) の行値比較で同じ順序のページを取得する
+        if request.class_code:
+            source = f"FROM {self.table} s JOIN spell_classes c ON c.spell_id = s.ID WHERE c.class_code = ?"
+            params = [request.class_code]
+        else:
+            source = f"FROM {self.table} s WHERE 1=1"
+            params = []
+        if request.level is not None:
+            source += " AND s.level = ?"
+            params.append(request.level)
+
+        total = (await self.pool.fetchone(f"SELECT COUNT(*) {source}", tuple(params)))[0]
+
+        limit = PAGE_SIZE
+        descending = request.direction in ('p', 'l')
+        if request.direction == 'n':
+            source += " AND (COALESCE(s.level, -1), s.ID) > (?, ?)"
+            params.extend(request.cursor)
+        elif request.direction == 'p':
+            source += " AND (COALESCE(s.level, -1), s.ID) < (?, ?)"
+            params.extend(request.cursor)
+        elif request.direction == 'l':
+            limit = total - max(total - 1, 0) // PAGE_SIZE * PAGE_SIZE
+        order = "s.level DESC, s.ID DESC" if descending else "s.level, s.ID"
+        params.append(limit)
+
+        rows = await self.pool.fetchall(f"SELECT s.* {source} ORDER BY {order} LIMIT ?", tuple(params))
+        return (rows[::-1] if descending else rows), total
+
+    async def render_page(self, request: PageRequest):
+        """ページを描画キャッシュから返す。ページに呪文がない場合は None。"""
+        cache_key = render_cache.key(self.catalog, ('page', request))
+        page = render_cache.get(cache_key)
+        if page is not None:
+            return page
+
+        spells, total = await self._fetch(request)
+        if not spells:
+            return None
+        page_count = (total + PAGE_SIZE - 1) // PAGE_SIZE
+        if request.direction == 'f':
+            page_index = 0
+        elif request.direction == 'l':
+            page_index = page_count - 1
+        else:
+            page_index = min(max(request.page, 0), page_count - 1)
+
+        page = RenderedPage(
+            request.class_code, request.level,
+            self.render(spells, page_index, page_count),
+            tuple(spell['ID'] for spell in spells),
+            page_index, page_count,
+            (_level_of(spells[0]), spells[0]['ID']),
+            (_level_of(spells[-1]), spells[-1]['ID'])
+        )
+        render_cache.put(cache_key, page)
+        return page
+
+    async def first_page(self, class_name: str = None, level: int = None):
+        page = await self.render_page(PageRequest(class_name.upper() if class_name else None, level, 'f', 0, None))
+        if page is not None:
+            self.prefetch(page)
+        return page
+
+    def prefetch(self, page: RenderedPage):
+        """次のページをバックグラウンドで描画キャッシュに載せておく。"""
+        if page.page + 1 >= page.page_count:
+            return
+        request = PageRequest(page.class_code, page.level, 'n', page.page + 1, page.last)
+        if request in self._prefetching:
+            return
+        task = asyncio.create_task(self.render_page(request))
+        self._prefetching[request] = task
+        task.add_done_callback(lambda _: self._prefetching.pop(request, None))
+
+    # ---- 表示 ----
+    def view(self, page: RenderedPage) -> discord.ui.View:
+        """ページ送りと呪文セット用の番号ボタン。押下はCogのリスナーで処理するので、Viewはディスパッチ対象として登録しない。"""
+        at_first = page.page == 0
+        at_last = page.page + 1 >= page.page_count
+        view = discord.ui.View(timeout=None)
+        view.add_item(discord.ui.Button(
+            emoji='⏮', style=discord.ButtonStyle.secondary, disabled=at_first,
+            custom_id=self._custom_id(page.class_code, page.level, 'f', 0)
+        ))
+        view.add_item(discord.ui.Button(
+            emoji='◀', style=discord.ButtonStyle.primary, disabled=at_first,
+            custom_id=self._custom_id(page.class_code, page.level, 'p', page.page - 1, page.first)
+        ))
+        view.add_item(discord.ui.Button(
+            label=f"{page.page + 1}/{page.page_count}", style=discord.ButtonStyle.secondary, disabled=True,
+            custom_id=f"{CUSTOM_ID_PREFIX}:{self.table}:indicator"
+        ))
+        view.add_item(discord.ui.Button(
+            emoji='▶', style=discord.ButtonStyle.primary, disabled=at_last,
+            custom_id=self._custom_id(page.class_code, page.level, 'n', page.page + 1, page.last)
+        ))
+        view.add_item(discord.ui.Button(
+            emoji='⏭', style=discord.ButtonStyle.secondary, disabled=at_last,
+            custom_id=self._custom_id(page.class_code, page.level, 'l', page.page_count - 1)
+        ))
+        add_spell_set_buttons(view, self.table, page.spell_ids)
+        view.stop()
+        return view
+
+    async def handle(self, interaction: discord.Interaction) -> bool:
+        """ページ送りボタンの押下であれば該当ページに差し替えて True を返す。"""
+        if interaction.type != discord.InteractionType.component:
+            return False
+        request = self.parse(interaction.custom_id or '')
+        if request is None:
+            return False
+        if not await startup.admit(interaction, self.cog_name):
+            return True
+
+        with metrics.measure('component', CUSTOM_ID_PREFIX):
+            page = await self.render_page(request)
+            if page is None:
+                await interaction.response.send_message("このページは表示できません。もう一度コマンドを実行してください。", ephemeral=True)
+                return True
+            await interaction.response.edit_message(embed=page.embed, view=self.view(page))
+        spell_messages.remember(interaction.message.id, self.table, page.spell_ids)
+        self.prefetch(page)
+        return True
@@ -0,0 +1,88 @@
+# --------------------------------------------------------------------------------
+#  呪文の全文検索 (FTS5)
+#  名前・説明・高レベル化をtrigramで索引化する。trigramは分かち書き不要なので日本語もそのまま検索できる
+# --------------------------------------------------------------------------------
+SEARCH_LIMIT = 60
+MIN_TRIGRAM_LENGTH = 3
+
+
+async def setup_spell_fts(db, table: str):
+    """{table}_fts 仮想テーブルと同期用トリガーを作成する。新規作成時は既存の行から索引を構築する。"""
+    fts = f'{table}_fts'
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,))
+    exists = await cursor.fetchone() is not None
+
+    await db.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            name, description, highlevel,
+            content='{table}', content_rowid='ID', tokenize='trigram'
+        )
+    ''')
+    await db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, name, description, highlevel)
+            VALUES (new.ID, new.name, new.description, new.highlevel);
+        END
+    ''')
+    await db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, name, description, highlevel)
+            VALUES ('delete', old.ID, old.name, old.description, old.highlevel);
+        END
+    ''')
+    await db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, name, description, highlevel)
+            VALUES ('delete', old.ID, old.name, old.description, old.highlevel);
+            INSERT INTO {fts} (rowid, name, description, highlevel)
+            VALUES (new.ID, new.name, new.description, new.highlevel);
+        END
+    ''')
+    if not exists:
+        await db.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def _like_pattern(term: str) -> str:
+    """term を部分一致させる LIKE のパターン (ESCAPE '\\' と併用する)。% と _ は文字そのものとして扱う。"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+async def search_spells(pool, table: str, query: str, limit: int = SEARCH_LIMIT):
+    """名前・説明・高レベル化から呪文を検索し、関連度順 (bm25、名前の一致を重視) で返す。
+
+    空白区切りの語は全て含むものを返す。trigramは3文字未満の語を扱えないため、
+    その場合は LIKE による検索に切り替える。
+    """
+    terms = query.split()
+    if not terms:
+        return []
+
+    fts = f'{table}_fts'
+    if all(len(term) >= MIN_TRIGRAM_LENGTH for term in terms):
+        match = ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+        return await pool.fetchall(f'''
+            SELECT s.* FROM {fts} f
+            JOIN {table} s ON s.ID = f.rowid
+            WHERE {fts} MATCH ?
+            ORDER BY bm25({fts}, 10.0, 1.0, 1.0)
+            LIMIT ?
+        ''', (match, limit))
+
+    conditions = []
+    params = []
+    patterns = [_like_pattern(term) for term in terms]
+    for pattern in patterns:
+        conditions.append(
+            "(name LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\' OR highlevel LIKE ? ESCAPE '\\')"
+        )
+        params.extend((pattern, pattern, pattern))
+    name_hits = ' + '.join("(name LIKE ? ESCAPE '\\')" for _ in terms)
+    params.extend(patterns)
+    params.append(limit)
+    return await pool.fetchall(f'''
+        SELECT * FROM {table}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY ({name_hits}) DESC, level, ID
+        LIMIT ?
+    ''', tuple(params))
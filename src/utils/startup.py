@@ -0,0 +1,118 @@
+import asyncio
+import functools
+import sys
+import time
+import traceback
+
+from discord.ext import commands
+
+# --------------------------------------------------------------------------------
+#  起動処理
+#  各Cogの async_init() を依存関係 (INIT_AFTER に書いたCog名) の順を守りつつ並行に実行し、
+#  全て終わるまではコマンド・ボタン・オートコンプリートを受け付けない
+#  初期化に失敗したCogは、起動後もそのCogのコマンドとボタンを受け付けない
+# --------------------------------------------------------------------------------
+READY_WAIT = 2.0 # 秒。起動処理中に実行されたコマンドを待たせる最大時間 (応答期限の3秒より短くする)
+
+
+class WarmingUp(commands.CheckFailure):
+    def __init__(self):
+        super().__init__("起動処理中です。しばらくしてからもう一度お試しください。")
+
+
+class InitFailed(commands.CheckFailure):
+    def __init__(self):
+        super().__init__("この機能は起動時の初期化に失敗したため、現在利用できません。")
+
+
+class Startup:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready = asyncio.Event()
+        self.timings = {}
+        self.failures = {}
+        self.ready_after = None
+
+    async def run(self, bot):
+        """読み込み済みのCogを初期化する。失敗したCogに依存するCogは実行しない。"""
+        cogs = {name: cog for name, cog in bot.cogs.items() if hasattr(cog, 'async_init')}
+        tasks = {}
+
+        async def init(name, cog):
+            for dependency in getattr(cog, 'INIT_AFTER', ()):
+                if dependency in tasks and not await tasks[dependency]:
+                    self.failures[name] = f"依存する {dependency} の初期化に失敗しました"
+                    print(f"[起動] {name}: {self.failures[name]}", file=sys.stderr)
+                    return False
+            started = time.perf_counter()
+            try:
+                await cog.async_init()
+            except Exception as exc:
+                self.failures[name] = repr(exc)
+                print(f"[起動] {name} の初期化に失敗しました:", file=sys.stderr)
+                traceback.print_exception(type(exc), exc, exc.__traceback__, file=sys.stderr)
+                return False
+            self.timings[name] = time.perf_counter() - started
+            print(f"[起動] {name}: {self.timings[name]:.3f}秒")
+            return True
+
+        for name, cog in cogs.items():
+            tasks[name] = asyncio.ensure_future(init(name, cog))
+        await asyncio.gather(*tasks.values())
+
+        self.ready_after = time.perf_counter() - self.started_at
+        self.ready.set()
+        status = f"失敗 {len(self.failures)}件" if self.failures else "全て成功"
+        print(f"[起動] 準備完了: {self.ready_after:.3f}秒 ({len(cogs)}個のCogを初期化、{status})")
+        if self.failures:
+            print(
+                f"[起動] 警告: 初期化に失敗したCogがあります。これらのコマンドとボタンは利用できません: "
+                f"{', '.join(sorted(self.failures))}",
+                file=sys.stderr
+            )
+
+    def available(self, cog=None) -> bool:
+        """起動処理が終わっていて、cog (Cogかその名前) の初期化に失敗していなければ True。"""
+        return self.ready.is_set() and _cog_name(cog) not in self.failures
+
+    async def wait_ready(self, cog=None):
+        """起動処理が終わるまで少し待つ。間に合わなければ WarmingUp、cog の初期化に失敗していれば InitFailed を送出する。"""
+        if not self.ready.is_set():
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout=READY_WAIT)
+            except asyncio.TimeoutError:
+                raise WarmingUp()
+        if _cog_name(cog) in self.failures:
+            raise InitFailed()
+
+    async def check(self, ctx):
+        """全コマンド共通のチェック。"""
+        await self.wait_ready(ctx.cog)
+        return True
+
+    async def admit(self, interaction, cog) -> bool:
+        """ボタンなどの押下を処理してよいか。使えない状態であれば実行者にだけ理由を返して False。"""
+        try:
+            await self.wait_ready(cog)
+        except commands.CheckFailure as exc:
+            await interaction.response.send_message(str(exc), ephemeral=True)
+            return False
+        return True
+
+    def autocomplete(self, func):
+        """オートコンプリート関数を包み、そのCogが使えるようになるまでは候補を返さないようにする。"""
+        @functools.wraps(func)
+        async def wrapper(ctx):
+            if not self.available(ctx.cog):
+                return []
+            return await func(ctx)
+        return wrapper
+
+
+def _cog_name(cog):
+    if cog is None or isinstance(cog, str):
+        return cog
+    return cog.qualified_name
+
+
+startup = Startup()
@@ -0,0 +1,36 @@
+import discord
+
+# --------------------------------------------------------------------------------
+#  「もしかして」の候補ボタン
+#  名前が見つからなかったときの返信に、編集距離の近い名前をボタンとして付ける (custom_id: "suggest:<種類>:<名前>")
+#  押下は各Cogの on_interaction が custom_id だけで処理するので、再起動後の古いメッセージでも応答できる
+# --------------------------------------------------------------------------------
+SUGGEST_PREFIX = 'suggest'
+CUSTOM_ID_LIMIT = 100 # Discordのcustom_idの最大文字数
+BUTTON_LABEL_LIMIT = 80
+
+
+def not_found_reply(message: str, kind: str, names):
+    """見つからなかった旨の文と、候補があれば候補のボタンを付けた View を (content, view) で返す。"""
+    view = discord.ui.View(timeout=None)
+    for name in names:
+        custom_id = f'{SUGGEST_PREFIX}:{kind}:{name}'
+        # custom_idに収まらない長い名前は候補に出さない
+        if len(custom_id) > CUSTOM_ID_LIMIT:
+            continue
+        view.add_item(discord.ui.Button(
+            label=name[:BUTTON_LABEL_LIMIT], style=discord.ButtonStyle.primary, custom_id=custom_id
+        ))
+    if not view.children:
+        return message, None
+    # 押下は on_interaction で受けるので、View自体は待ち受けさせない
+    view.stop()
+    return f"{message}\nもしかして:", view
+
+
+def parse_suggestion_custom_id(custom_id: str, kind: str):
+    """custom_id が kind の候補ボタンであれば名前を、そうでなければ None を返す。"""
+    prefix = f'{SUGGEST_PREFIX}:{kind}:'
+    if not custom_id or not custom_id.startswith(prefix):
+        return None
+    return custom_id[len(prefix):] or None
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import discord
+
+# --------------------------------------------------------------------------------
+#  ユーザーIDから表示名への解決
+#  ゲートウェイのキャッシュ → DBに保存した名前 (TTL付き) → REST (並行取得) の順に参照する
+# --------------------------------------------------------------------------------
+NAME_TTL = 24 * 60 * 60 # 秒
+FETCH_CONCURRENCY = 5
+
+
+class UserNameResolver:
+    def __init__(self, bot, pool, ttl: float = NAME_TTL, concurrency: int = FETCH_CONCURRENCY):
+        self.bot = bot
+        self.db = pool
+        self.ttl = ttl
+        self.concurrency = concurrency
+
+    async def setup(self):
+        async with self.db.write() as db:
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS user_names (
+                    user_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+
+    async def resolve(self, user_ids):
+        """ユーザーIDの一覧に対する {ID: 名前} を返す。見つからないユーザーは「不明なユーザー」と表示する。"""
+        names = {}
+        missing = []
+        for user_id in user_ids:
+            user = self.bot.get_user(user_id)
+            if user is not None:
+                names[user_id] = user.name
+            else:
+                missing.append(user_id)
+
+        if missing:
+            placeholders = ', '.join('?' for _ in missing)
+            rows = await self.db.fetchall(
+                f'SELECT user_id, name FROM user_names WHERE fetched_at >= ? AND user_id IN ({placeholders})',
+                (time.time() - self.ttl, *missing)
+            )
+            names.update((row[0], row[1]) for row in rows)
+            missing = [user_id for user_id in missing if user_id not in names]
+
+        if missing:
+            fetched = await self._fetch(missing)
+            names.update(fetched)
+            now = time.time()
+
+            async def store(db):
+                await db.executemany(
+                    'INSERT OR REPLACE INTO user_names (user_id, name, fetched_at) VALUES (?, ?, ?)',
+                    [(user_id, name, now) for user_id, name in fetched.items()]
+                )
+            if fetched:
+                await self.db.transaction(store)
+
+        return {user_id: names.get(user_id, f"不明なユーザー (ID: {user_id})") for user_id in user_ids}
+
+    async def _fetch(self, user_ids):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_one(user_id):
+            async with semaphore:
+                try:
+                    user = await self.bot.fetch_user(user_id)
+                except (discord.NotFound, discord.HTTPException):
+                    return user_id, None
+                return user_id, user.name
+
+        results = await asyncio.gather(*(fetch_one(user_id) for user_id in user_ids))
+        return {user_id: name for user_id, name in results if name is not None}